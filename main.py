@@ -3,14 +3,22 @@ from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger
 from astrbot.api.message_components import *
 import os
-import json
-import re
 import aiohttp
 import hashlib
 import asyncio
 
 from .modules.command_triggered import CommandTriggeredModule
 from .modules.auto_detect import AutoDetectModule
+from .modules.matcher import MessageText, RegexCache
+from .modules.rule_index import RuleIndexManager
+from .modules.regex_pool import RegexPool
+from .modules.regex_safety import analyze_regex
+from .modules.data_saver import DebouncedSaver
+from .modules.storage import JsonRepository, JournalRepository, empty_data, JOURNAL_SEQ_KEY
+from .modules.sqlite_store import SqliteRepository, export_to_json
+from .modules.lazy_entries import EntryStore
+from .modules.stream_loader import StreamingLoader, ITEM
+from .modules.rule_index import RULE_ADDED
 from .web.webui_server import WebUIServer
 
 @register("astrbot_plugin_keywords_reply", "Foolllll", "支持图文回复、正则匹配关键词和灵活管理的关键词回复插件。", "v1.1.0", "https://github.com/Foolllll-J/astrbot_plugin_keywords_reply")
@@ -24,9 +32,44 @@ class KeywordsReplyPlugin(Star):
 
         os.makedirs(self.image_dir, exist_ok=True)
 
-        self.data = self._load_data()
+        self.repository = self._create_repository()
+        # 流式加载：先以空规则完成注册，initialize 后在后台线程逐条解析 keywords.json 并陆续上线
+        self.loader = None
+        self._save_pending = False
+        # 读取已有数据失败时的原因；此时内存中的数据不完整，禁止保存，避免覆盖原文件
+        self.load_error = None
+        if self.config.get("streaming_load", False) and isinstance(self.repository, JsonRepository) \
+                and self.repository.streamable():
+            self.data = empty_data()
+            self.loader = StreamingLoader(self.data_file, self._publish_loaded, self._finish_loading)
+        else:
+            self.data = self.repository.load()
+            if self.repository.load_failed:
+                self._block_saves("读取关键词数据失败")
+        # 回复内容按需加载：匹配只需要关键词与设置，回复内容移到内存映射的文件中
+        self.entry_store = None
+        if self.config.get("lazy_entries", False):
+            self.entry_store = EntryStore(
+                os.path.join(self.data_dir, "keywords.entries.bin"), self.config.get("entry_cache_size", 256)
+            )
+            if self.loader is None:
+                self.entry_store.build(self.data)
+        # 修改后延迟合并写入，批量操作只落盘一次；写文件在后台线程进行
+        self.saver = DebouncedSaver(
+            self._snapshot_data,
+            self._write_data,
+            self.config.get("save_debounce_ms", 500) / 1000,
+            self.config.get("save_max_delay_ms", 3000) / 1000,
+        )
+        self.regex_cache = RegexCache(self.config.get("use_re2", False))
         self.cmd_module = CommandTriggeredModule(self)
         self.detect_module = AutoDetectModule(self)
+        self.index_manager = RuleIndexManager(self.cmd_module, self.detect_module)
+        self.index_manager.rebuild_all()
+        self.index_manager.listeners.append(self.repository.record)
+        # 正则限时执行：超时时间大于 0 时正则在独立进程池中执行
+        regex_timeout_ms = self.config.get("regex_timeout_ms", 0)
+        self.regex_pool = RegexPool(regex_timeout_ms, self.config.get("regex_workers", 2)) if regex_timeout_ms > 0 else None
         self.logger = logger  # 添加 logger 属性供 WebUI 使用
 
         # WebUI 服务器
@@ -39,21 +82,82 @@ class KeywordsReplyPlugin(Star):
                 session_timeout=self.config.get("webui_session_timeout", 3600)
             )
         
-    def _load_data(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"加载关键词数据失败: {e}")
-        return {"command_triggered": [], "auto_detect": []}
-
-    def _save_data(self):
+    def _create_repository(self):
+        """按配置选择存储方式；从 SQLite 切换回文件存储时先把数据库导出为 keywords.json"""
+        mode = self.config.get("storage_mode", "json")
+        source = lambda: self.data
+        if mode == "sqlite":
+            return SqliteRepository(self.data_file, source)
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            export_to_json(self.data_file)
         except Exception as e:
-            logger.error(f"保存关键词数据失败: {e}")
+            logger.error(f"导出 SQLite 数据失败: {e}")
+        if mode == "journal":
+            return JournalRepository(self.data_file, source, self.config.get("journal_compact_kb", 1024) * 1024)
+        return JsonRepository(self.data_file, source)
+
+    def _publish_loaded(self, batch: list) -> int:
+        """在事件循环中发布流式加载解析出的一批数据，返回其中的规则数"""
+        published = 0
+        for kind, key, value in batch:
+            if kind == ITEM:
+                rules = self.data.setdefault(key, [])
+                rules.append(value)
+                if key in self.index_manager.indexes:
+                    self.index_manager.notify(key, RULE_ADDED, len(rules) - 1)
+                    published += 1
+            elif key != JOURNAL_SEQ_KEY and not (isinstance(value, list) and key in self.data):
+                # 规则列表在注册时已建立，加载期间新增的规则已在其中，不能整体替换
+                self.data[key] = value
+        return published
+
+    def _finish_loading(self, error):
+        loader = self.loader
+        if error is not None:
+            logger.error(f"流式加载关键词数据失败，已加载 {loader.loaded} 条规则: {error}，改为整体读取")
+            self._reload_after_stream_error(error)
+        else:
+            logger.info(f"关键词数据加载完成: {loader.loaded} 条规则，用时 {loader.elapsed:.2f}s")
+        if self.entry_store is not None:
+            self.entry_store.build(self.data)
+        if self._save_pending:
+            self._save_pending = False
+            self._save_data()
+
+    def _reload_after_stream_error(self, error):
+        """流式解析失败后整体重新读取 keywords.json，仍然失败时禁止保存"""
+        data = self.repository.load()
+        if self.repository.load_failed:
+            self._block_saves(f"加载关键词数据失败: {error}")
+            return
+        if self._save_pending:
+            logger.warning("加载期间的修改基于不完整的数据，已丢弃")
+            self._save_pending = False
+        self.data = data
+        self.index_manager.rebuild_all()
+
+    def _block_saves(self, reason: str):
+        self.load_error = reason
+        logger.error(f"{reason}。为避免覆盖原有数据，本次运行中的修改都不会保存，请修复 keywords.json 后重载插件")
+
+    def _save_data(self):
+        """标记数据已修改，由 saver 延迟合并后写入"""
+        if self.load_error:
+            logger.warning(f"{self.load_error}，本次修改未保存")
+            return
+        if self.loader is not None and not self.loader.done:
+            # 数据尚未加载完，此时写入会用不完整的数据覆盖 keywords.json，加载完成后再保存
+            self._save_pending = True
+            return
+        self.repository.note_save()
+        self.saver.mark_dirty()
+
+    def _snapshot_data(self):
+        """在事件循环中取出待写内容，具体内容由存储方式决定"""
+        return self.repository.take_batch()
+
+    def _write_data(self, snapshot):
+        self.repository.write_batch(snapshot)
 
     async def _download_image(self, url: str) -> str:
         try:
@@ -70,6 +174,10 @@ class KeywordsReplyPlugin(Star):
             logger.error(f"下载图片失败: {e}")
         return None
 
+    def _message_text(self, event: AstrMessageEvent) -> MessageText:
+        """构建本条消息的规范化文本，各匹配模块共享同一份结果"""
+        return MessageText(event.message_str, self.config.get("nfkc_normalize", False))
+
     def _is_admin(self, event: AstrMessageEvent):
         if event.is_admin():
             return True
@@ -144,14 +252,30 @@ class KeywordsReplyPlugin(Star):
             return None
 
     async def initialize(self):
-        """初始化插件，启动 WebUI 服务器"""
+        """初始化插件，开始流式加载关键词数据并启动 WebUI 服务器"""
+        if self.loader is not None:
+            self.loader.start(asyncio.get_running_loop())
         if self.webui:
             await self.webui.start()
 
     async def terminate(self):
-        """终止插件，停止 WebUI 服务器"""
+        """终止插件，停止 WebUI 服务器与正则进程池，写入尚未保存的修改"""
         if self.webui:
             await self.webui.stop()
+        if self.loader is not None and not self.loader.done:
+            self.loader.cancel()
+            if self._save_pending:
+                logger.warning("关键词数据尚未加载完成，加载期间的修改未保存")
+        await self.saver.aflush()
+        self.saver.close()
+        self.repository.close()
+        if self.entry_store:
+            self.entry_store.close()
+        stats = self.saver.stats()
+        if stats["coalesced"]:
+            logger.info(f"关键词数据共请求保存 {stats['requests']} 次，实际写入 {stats['writes']} 次，合并 {stats['coalesced']} 次")
+        if self.regex_pool:
+            self.regex_pool.shutdown()
 
     @filter.command("设置WebUI密码")
     async def set_webui_password_cmd(self, event: AstrMessageEvent):
@@ -178,27 +302,15 @@ class KeywordsReplyPlugin(Star):
         else:
             yield event.plain_result("密码设置失败，请检查日志。")
 
-    def _is_safe_regex(self, pattern: str) -> bool:
-        dangerous_patterns = [
-            r'\(\?\:',
-            r'\(\?\!',
-            r'\(\?\<',
-            r'\*\+',
-            r'\+\*',
-            r'\*\*',
-            r'\+\+',
-            r'\((?:[^()]*[+*{][^()]*)\)\s*\+',
-            r'\{[^{}]*\}[^{}]*\{[^{}]*\}',
-        ]
-        
-        if len(pattern) > 100:
-            return False
-            
-        for dangerous in dangerous_patterns:
-            if re.search(dangerous, pattern):
-                return False
-                
-        return True
+    def _regex_risk(self, pattern: str, flags: int = 0) -> str:
+        """静态分析正则的灾难性回溯风险，安全时返回空字符串，否则返回原因"""
+        return analyze_regex(pattern, flags)
+
+    def _regex_warning(self, pattern: str, flags: int = 0) -> str:
+        """返回不足以拒绝、但值得提示的回溯风险（如 .*(\\d+).*），没有时返回空字符串"""
+        warnings = []
+        analyze_regex(pattern, flags, warnings)
+        return "；".join(warnings)
 
     @filter.command("添加关键词")
     async def add_keyword_cmd(self, event: AstrMessageEvent):
@@ -465,7 +577,8 @@ class KeywordsReplyPlugin(Star):
     @filter.event_message_type(filter.EventMessageType.ALL)
     async def on_message(self, event: AstrMessageEvent, *args, **kwargs):
         """处理所有消息事件，包括命令触发和自动检测。"""
-        msg = event.message_str.strip()
+        text = self._message_text(event)
+        msg = text.raw
         if not msg: return
         
         management_prefixes = ["/添加", "/编辑", "/删除", "/启用", "/禁用", "/查看", "添加", "编辑", "删除", "启用", "禁用", "查看"]
@@ -476,7 +589,7 @@ class KeywordsReplyPlugin(Star):
         kw_delay = int(recall_delay[0]) if len(recall_delay) > 0 else 0
         dt_delay = int(recall_delay[1]) if len(recall_delay) > 1 else 0
 
-        res = await self.cmd_module.handle_message(event)
+        res = await self.cmd_module.handle_message(event, text)
         if res:
             if kw_delay > 0:
                 await self._send_and_recall(event, res, kw_delay)
@@ -486,7 +599,7 @@ class KeywordsReplyPlugin(Star):
                 event.stop_event()
             return
 
-        res = await self.detect_module.handle_message(event)
+        res = await self.detect_module.handle_message(event, text)
         if res:
             if dt_delay > 0:
                 await self._send_and_recall(event, res, dt_delay)
@@ -1,88 +1,71 @@
-import time
 import re
 import random
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Plain
+from .matcher import MessageText
+from .cooldown import CooldownStore, cooldown_keys
+from .rule_index import DetectIndex, RULE_ADDED, RULE_REMOVED, KEYWORD_CHANGED, FLAGS_CHANGED, GROUPS_CHANGED, ENTRIES_CHANGED
 
 class AutoDetectModule:
     def __init__(self, plugin):
         self.plugin = plugin
         self.data_key = "auto_detect"
-        self._last_triggered = {}
+        self.cooldowns = CooldownStore()
+        self.index = DetectIndex(self)
 
-    def _match_keyword(self, text, keyword_cfg):
-        keyword = keyword_cfg["keyword"]
-        is_regex = keyword_cfg.get("regex", False)
+    def _regex_flags(self, keyword_cfg):
         case_sensitive = keyword_cfg.get("case_sensitive", self.plugin.config.get("case_sensitive", False))
-        
-        flags = 0
-        if not case_sensitive:
-            flags = re.IGNORECASE
-            
-        if is_regex:
-            try:
-                return re.search(keyword, text, flags)
-            except Exception as e:
-                logger.error(f"正则表达式检测错误 (关键词: {keyword}): {e}")
-                return False
-        else:
-            if not case_sensitive:
-                text = text.lower()
-                keyword = keyword.lower()
-            return keyword in text
+        return 0 if case_sensitive else re.IGNORECASE
 
-    async def handle_message(self, event: AstrMessageEvent):
+    async def handle_message(self, event: AstrMessageEvent, text: MessageText = None):
         if event.is_at_or_wake_command:
             return None
             
-        msg = event.message_str.strip()
-        session_id = event.get_group_id() or event.get_sender_id() # 优先使用群号，私聊则使用发送者 ID
-        now = time.time()
+        if text is None:
+            text = self.plugin._message_text(event)
+        msg = text.text
+        user_id = event.get_sender_id()
+        session_id = event.get_group_id() or user_id # 优先使用群号，私聊则使用发送者 ID
+        now = self.cooldowns.now()
         
         cooldown = self.plugin.config.get("cooldown", 0)
         ignore_cooldown_on_exact_match = self.plugin.config.get("ignore_cooldown_on_exact_match", False)
         
-        for i, cfg in enumerate(self.plugin.data[self.data_key]):
-            if self._match_keyword(msg, cfg):
-                if not cfg.get("enabled", True):
-                    continue
-                
-                # 检查是否完全匹配且非正则
-                is_regex = cfg.get("regex", False)
-                is_exact_match = msg == cfg["keyword"]
-                
-                # 冷却时间检查
-                skip_cooldown = ignore_cooldown_on_exact_match and is_exact_match and not is_regex
-                
-                if not skip_cooldown and cooldown > 0 and session_id in self._last_triggered:
-                    elapsed = now - self._last_triggered[session_id]
-                    if elapsed < cooldown:
-                        logger.debug(f"检测词触发处于冷却中 (Session: {session_id}), 剩余 {cooldown - elapsed:.1f}s")
-                        continue # 尝试匹配下一个检测词
-                
-                mode = cfg.get("mode", "whitelist")
-                groups = cfg.get("groups", [])
-                
-                group_id = event.get_group_id()
-                if group_id and mode != "all":
-                    if mode == "whitelist":
-                        if group_id not in groups:
-                            continue
-                    elif mode == "blacklist":
-                        if group_id in groups:
-                            continue
-                
-                logger.info(f"检测词触发: {cfg['keyword']} (来自: {event.get_sender_id()})")
-                if not cfg.get("entries"):
-                    continue
-                
-                # 更新最后触发时间（如果不是跳过冷却的情况）
-                if cooldown > 0 and not skip_cooldown:
-                    self._last_triggered[session_id] = now
-                
-                entry = random.choice(cfg.get("entries", []))
-                return self.plugin._get_reply_result(event, entry, use_quote=True)
+        if self.plugin.regex_pool is not None:
+            matches = await self.index.collect_matches(text, event.get_group_id(), self.plugin.regex_pool)
+        else:
+            matches = self.index.iter_matches(text, event.get_group_id())
+        for rule in matches:
+            # 检查是否完全匹配且非正则
+            is_exact_match = msg == rule.normalized
+            
+            # 冷却时间检查
+            skip_cooldown = ignore_cooldown_on_exact_match and is_exact_match and not rule.regex
+            # 规则可单独设置冷却时长与范围，未设置时使用全局冷却、按会话共享
+            duration = rule.cooldown
+            if duration is None:
+                duration = cooldown
+            keys = ()
+            if not skip_cooldown and duration > 0:
+                # 规则配置对象在编辑后保持不变，用它的 id 区分规则，关键词相同的规则不共享冷却
+                keys = cooldown_keys(rule.cooldown_scopes, session_id, user_id, id(rule.cfg))
+                remaining = self.cooldowns.remaining_any(keys, duration, now)
+                if remaining > 0:
+                    logger.debug(f"检测词触发处于冷却中 (Session: {session_id}), 剩余 {remaining:.1f}s")
+                    continue # 尝试匹配下一个检测词
+            
+            logger.info(f"检测词触发: {rule.keyword} (来自: {user_id})")
+            entries = rule.entries
+            if not entries:
+                continue
+            
+            # 记录触发时间（如果不是跳过冷却的情况）
+            for key in keys:
+                self.cooldowns.start(key, duration, now)
+            
+            entry = random.choice(entries)
+            return self.plugin._get_reply_result(event, entry, use_quote=True)
         return None
 
     def _find_indices(self, param: str) -> list[int]:
@@ -113,12 +96,7 @@ class AutoDetectModule:
             pass
 
         # 尝试作为检测词匹配
-        indices = []
-        for i, cfg in enumerate(data):
-            if cfg['keyword'] == param:
-                indices.append(i)
-        
-        return indices
+        return self.index.positions(param)
 
     def _strip_components(self, components, keyword, remaining):
         """从组件列表中剥离命令和关键词，保留回复内容。"""
@@ -179,14 +157,18 @@ class AutoDetectModule:
             return
 
         if is_regex:
-            if not self.plugin._is_safe_regex(keyword):
-                yield event.plain_result("正则表达式存在安全风险，请简化后重试。")
+            risk = self.plugin._regex_risk(keyword, self._regex_flags({}))
+            if risk:
+                yield event.plain_result(f"正则表达式存在安全风险：{risk}。请简化后重试。")
                 return
             try:
-                re.compile(keyword)
+                self.plugin.regex_cache.compile(keyword, self._regex_flags({}))
             except Exception as e:
                 yield event.plain_result(f"无效的正则表达式: {e}")
                 return
+            warning = self.plugin._regex_warning(keyword, self._regex_flags({}))
+            if warning:
+                yield event.plain_result(f"提示：{warning}。")
 
         components = event.get_messages()
         reply_components = self._strip_components(components, keyword, remaining)
@@ -196,19 +178,24 @@ class AutoDetectModule:
             yield event.plain_result("回复内容不能为空。")
             return
 
-        keyword_cfg = next((item for item in self.plugin.data[self.data_key] if item["keyword"] == keyword), None)
+        # 先处理图片再定位规则：下载图片期间列表可能被其他操作增删
+        processed_entry = await self.plugin._process_entry_images(entry)
+        positions = self.index.positions(keyword)
+        keyword_cfg = self.plugin.data[self.data_key][positions[0]] if positions else None
         
         current_group_id = event.get_group_id()
         is_group = event.get_platform_name() != "private"
         
         if keyword_cfg:
-            processed_entry = await self.plugin._process_entry_images(entry)
             keyword_cfg["entries"].append(processed_entry)
-            keyword_cfg["regex"] = is_regex
+            idx = positions[0]
+            if keyword_cfg.get("regex", False) != is_regex:
+                keyword_cfg["regex"] = is_regex
+                self.plugin.index_manager.notify(self.data_key, FLAGS_CHANGED, idx)
+            else:
+                self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, idx)
             status_msg = f"已为现有检测词添加新回复（当前共有 {len(keyword_cfg['entries'])} 个回复）。"
         else:
-            processed_entry = await self.plugin._process_entry_images(entry)
-            
             if is_group and current_group_id:
                 enabled = True
                 mode = "whitelist"
@@ -230,6 +217,7 @@ class AutoDetectModule:
                 "case_sensitive": self.plugin.config.get("case_sensitive", False)
             }
             self.plugin.data[self.data_key].append(keyword_cfg)
+            self.plugin.index_manager.notify(self.data_key, RULE_ADDED, len(self.plugin.data[self.data_key]) - 1)
 
         self.plugin._save_data()
         logger.info(f"添加检测词: {keyword} (操作者: {event.get_sender_id()})")
@@ -268,18 +256,32 @@ class AutoDetectModule:
             return
             
         idx = indices[0]
+        cfg = self.plugin.data[self.data_key][idx]
         
         if is_regex:
+            flags = self._regex_flags(cfg)
+            risk = self.plugin._regex_risk(new_keyword, flags)
+            if risk:
+                yield event.plain_result(f"正则表达式存在安全风险：{risk}。请简化后重试。")
+                return
             try:
-                re.compile(new_keyword)
+                self.plugin.regex_cache.compile(new_keyword, flags)
             except Exception as e:
                 yield event.plain_result(f"无效的正则表达式: {e}")
                 return
+            warning = self.plugin._regex_warning(new_keyword, flags)
+            if warning:
+                yield event.plain_result(f"提示：{warning}。")
         
-        if 0 <= idx < len(self.plugin.data[self.data_key]):
-            old_keyword = self.plugin.data[self.data_key][idx]["keyword"]
-            self.plugin.data[self.data_key][idx]["keyword"] = new_keyword
-            self.plugin.data[self.data_key][idx]["regex"] = is_regex
+        # 发送提示期间列表可能被其他操作增删，按规则对象重新定位
+        idx = self.index.position_of(cfg)
+        if idx is not None:
+            old_keyword = cfg["keyword"]
+            if old_keyword != new_keyword:
+                self.plugin.regex_cache.invalidate(old_keyword)
+            cfg["keyword"] = new_keyword
+            cfg["regex"] = is_regex
+            self.plugin.index_manager.notify(self.data_key, KEYWORD_CHANGED, idx)
             self.plugin._save_data()
             logger.info(f"编辑检测词: {old_keyword} -> {new_keyword} (操作者: {event.get_sender_id()})")
             yield event.plain_result(f"已更新检测词 '{old_keyword}' 为: {new_keyword}")
@@ -308,7 +310,10 @@ class AutoDetectModule:
             deleted_keywords = []
             for idx in indices:
                 cfg = self.plugin.data[self.data_key].pop(idx)
+                self.plugin.index_manager.notify(self.data_key, RULE_REMOVED, idx)
                 deleted_keywords.append(cfg['keyword'])
+                if cfg.get("regex", False):
+                    self.plugin.regex_cache.invalidate(cfg['keyword'])
             
             self.plugin._save_data()
             logger.info(f"删除检测词: {', '.join(deleted_keywords)} (操作者: {event.get_sender_id()})")
@@ -372,11 +377,14 @@ class AutoDetectModule:
                         cfg["mode"] = "whitelist"
                         cfg["groups"] = []
                     
+                    members = set(cfg["groups"])
                     for gid in args:
                         if not gid.isdigit():
+                            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
                             yield event.plain_result(f"群号格式错误: {gid}")
                             return
-                        if gid not in cfg["groups"]:
+                        if gid not in members:
+                            members.add(gid)
                             cfg["groups"].append(gid)
                     groups_str = ", ".join(args)
                     cfg["enabled"] = True
@@ -407,15 +415,19 @@ class AutoDetectModule:
                         cfg["mode"] = "blacklist"
                         cfg["groups"] = []
                     
+                    members = set(cfg["groups"])
                     for gid in args:
                         if not gid.isdigit():
+                            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
                             yield event.plain_result(f"群号格式错误: {gid}")
                             return
-                        if gid not in cfg["groups"]:
+                        if gid not in members:
+                            members.add(gid)
                             cfg["groups"].append(gid)
                     groups_str = ", ".join(args)
                     cfg["enabled"] = True
 
+            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
             self.plugin._save_data()
             logger.info(f"修改检测词群聊限制: {cfg['keyword']} -> {cmd_name} {groups_str} (操作者: {event.get_sender_id()})")
             yield event.plain_result(f"检测词 '{cfg['keyword']}' {cmd_name} 群聊: {groups_str}")
@@ -617,7 +629,12 @@ class AutoDetectModule:
             return
 
         processed_entry = await self.plugin._process_entry_images(entry)
+        target_idx = self.index.position_of(cfg)
+        if target_idx is None:
+            yield event.plain_result(f"检测词 '{cfg['keyword']}' 已被删除，回复未添加。")
+            return
         cfg["entries"].append(processed_entry)
+        self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, target_idx)
         self.plugin._save_data()
         
         yield event.plain_result(f"已为检测词 '{cfg['keyword']}' 添加新回复（当前共有 {len(cfg['entries'])} 个回复）。")
@@ -701,7 +718,15 @@ class AutoDetectModule:
                  return
             
             processed_entry = await self.plugin._process_entry_images(entry)
+            kw_idx = self.index.position_of(cfg)
+            if kw_idx is None:
+                yield event.plain_result(f"检测词 '{cfg['keyword']}' 已被删除，回复未更新。")
+                return
+            if reply_idx >= len(cfg["entries"]):
+                yield event.plain_result("该回复已被删除，请重新查看后再编辑。")
+                return
             cfg["entries"][reply_idx] = processed_entry
+            self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, kw_idx)
             
             self.plugin._save_data()
             logger.info(f"编辑检测词回复: {cfg['keyword']} (序号 {reply_idx+1}) (操作者: {event.get_sender_id()})")
@@ -747,6 +772,7 @@ class AutoDetectModule:
             
             if 0 <= reply_idx < len(entries):
                 keyword_cfg["entries"].pop(reply_idx)
+                self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, idx)
                 keyword = keyword_cfg["keyword"]
                 
                 self.plugin._save_data()
@@ -3,82 +3,57 @@ import random
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Plain
+from .matcher import MessageText
+from .rule_index import CommandIndex, RULE_ADDED, RULE_REMOVED, KEYWORD_CHANGED, FLAGS_CHANGED, GROUPS_CHANGED, ENTRIES_CHANGED
 
 class CommandTriggeredModule:
     def __init__(self, plugin):
         self.plugin = plugin
         self.data_key = "command_triggered"
+        self.index = CommandIndex(self)
 
-    def _match_keyword(self, text, keyword_cfg):
-        keyword = keyword_cfg["keyword"]
-        is_regex = keyword_cfg.get("regex", False)
-        case_sensitive = self.plugin.config.get("case_sensitive", False)
-        
-        flags = 0
-        if not case_sensitive:
-            flags = re.IGNORECASE
-            
-        if is_regex:
-            try:
-                match = re.fullmatch(keyword, text, flags)
-                return bool(match), match
-            except Exception as e:
-                logger.error(f"正则表达式匹配错误 (关键词: {keyword}): {e}")
-                return False, None
-        else:
-            if not case_sensitive:
-                text = text.lower()
-                keyword = keyword.lower()
-            return text == keyword, None
+    def _regex_flags(self):
+        return 0 if self.plugin.config.get("case_sensitive", False) else re.IGNORECASE
 
-    async def handle_message(self, event: AstrMessageEvent):
+    async def handle_message(self, event: AstrMessageEvent, text: MessageText = None):
         if not event.is_at_or_wake_command:
             return None
             
-        msg_str = event.message_str.strip()
-        if not msg_str:
+        if text is None:
+            text = self.plugin._message_text(event)
+        if not text.text:
             return None
             
-        potential_cmd = msg_str.split()[0]
+        potential_cmd = text.first_token
         group_id = event.get_group_id()
         
-        for cfg in self.plugin.data[self.data_key]:
-            matched, regex_match = self._match_keyword(potential_cmd, cfg)
-            if matched:
-                if not cfg.get("enabled", True):
-                    continue
-                
-                mode = cfg.get("mode", "whitelist")
-                groups = cfg.get("groups", [])
-                
-                if group_id and mode != "all":
-                    if mode == "whitelist":
-                        if group_id not in groups:
-                            continue
-                    elif mode == "blacklist":
-                        if group_id in groups:
-                            continue
-                
-                logger.info(f"关键词触发: {potential_cmd} (来自: {event.get_sender_id()})")
-                if not cfg.get("entries"):
-                    return None
-                entry = random.choice(cfg.get("entries", []))
-                reply_entry = entry.copy()
-
-                # 正则匹配时，将第一捕获组替换到回复文本中的 XX 占位符。
-                captured = ""
-                if regex_match:
-                    try:
-                        group1 = regex_match.group(1)
-                        if group1:
-                            captured = group1
-                    except IndexError:
-                        captured = ""
-
-                if captured and reply_entry.get("text"):
-                    reply_entry["text"] = reply_entry["text"].replace("XX", captured)
-
-                return self.plugin._get_reply_result(event, reply_entry, use_quote=True)
+        if self.plugin.regex_pool is not None:
+            found = await self.index.first_match(text, group_id, self.plugin.regex_pool)
+            matches = [found] if found else []
+        else:
+            matches = self.index.iter_matches(text, group_id)
+        for rule, regex_match in matches:
+            logger.info(f"关键词触发: {potential_cmd} (来自: {event.get_sender_id()})")
+            entries = rule.entries
+            if not entries:
+                return None
+            entry = random.choice(entries)
+            reply_entry = entry.copy()
+
+            # 正则匹配时，将第一捕获组替换到回复文本中的 XX 占位符。
+            captured = ""
+            if regex_match:
+                try:
+                    group1 = regex_match.group(1)
+                    if group1:
+                        captured = group1
+                except IndexError:
+                    captured = ""
+
+            if captured and reply_entry.get("text"):
+                reply_entry["text"] = reply_entry["text"].replace("XX", captured)
+
+            return self.plugin._get_reply_result(event, reply_entry, use_quote=True)
         return None
 
     def _find_indices(self, param: str) -> list[int]:
@@ -102,12 +77,7 @@ class CommandTriggeredModule:
         except ValueError:
             pass
 
-        indices = []
-        for i, cfg in enumerate(data):
-            if cfg['keyword'] == param:
-                indices.append(i)
-        
-        return indices
+        return self.index.positions(param)
 
     def _strip_components(self, components, keyword, remaining):
         """从组件列表中剥离命令和关键词，保留回复内容。"""
@@ -168,14 +138,18 @@ class CommandTriggeredModule:
             return
 
         if is_regex:
-            if not self.plugin._is_safe_regex(keyword):
-                yield event.plain_result("正则表达式存在安全风险，请简化后重试。")
+            risk = self.plugin._regex_risk(keyword, self._regex_flags())
+            if risk:
+                yield event.plain_result(f"正则表达式存在安全风险：{risk}。请简化后重试。")
                 return
             try:
-                re.compile(keyword)
+                self.plugin.regex_cache.compile(keyword, self._regex_flags())
             except Exception as e:
                 yield event.plain_result(f"无效的正则表达式: {e}")
                 return
+            warning = self.plugin._regex_warning(keyword, self._regex_flags())
+            if warning:
+                yield event.plain_result(f"提示：{warning}。")
 
         components = event.get_messages()
         reply_components = self._strip_components(components, keyword, remaining)
@@ -185,19 +159,24 @@ class CommandTriggeredModule:
             yield event.plain_result("回复内容不能为空。")
             return
 
-        keyword_cfg = next((item for item in self.plugin.data[self.data_key] if item["keyword"] == keyword), None)
+        # 先处理图片再定位规则：下载图片期间列表可能被其他操作增删
+        processed_entry = await self.plugin._process_entry_images(entry)
+        positions = self.index.positions(keyword)
+        keyword_cfg = self.plugin.data[self.data_key][positions[0]] if positions else None
         
         current_group_id = event.get_group_id()
         is_group = event.get_platform_name() != "private"
         
         if keyword_cfg:
-            processed_entry = await self.plugin._process_entry_images(entry)
             keyword_cfg["entries"].append(processed_entry)
-            keyword_cfg["regex"] = is_regex
+            idx = positions[0]
+            if keyword_cfg.get("regex", False) != is_regex:
+                keyword_cfg["regex"] = is_regex
+                self.plugin.index_manager.notify(self.data_key, FLAGS_CHANGED, idx)
+            else:
+                self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, idx)
             status_msg = f"已为现有关键词添加新回复（当前共有 {len(keyword_cfg['entries'])} 个回复）。"
         else:
-            processed_entry = await self.plugin._process_entry_images(entry)
-            
             if is_group and current_group_id:
                 enabled = True
                 mode = "whitelist"
@@ -218,6 +197,7 @@ class CommandTriggeredModule:
                 "groups": groups
             }
             self.plugin.data[self.data_key].append(keyword_cfg)
+            self.plugin.index_manager.notify(self.data_key, RULE_ADDED, len(self.plugin.data[self.data_key]) - 1)
 
         self.plugin._save_data()
         logger.info(f"添加关键词: {keyword} (操作者: {event.get_sender_id()})")
@@ -255,18 +235,31 @@ class CommandTriggeredModule:
             return
         
         idx = indices[0]
+        cfg = self.plugin.data[self.data_key][idx]
         
         if is_regex:
+            risk = self.plugin._regex_risk(new_keyword, self._regex_flags())
+            if risk:
+                yield event.plain_result(f"正则表达式存在安全风险：{risk}。请简化后重试。")
+                return
             try:
-                re.compile(new_keyword)
+                self.plugin.regex_cache.compile(new_keyword, self._regex_flags())
             except Exception as e:
                 yield event.plain_result(f"无效的正则表达式: {e}")
                 return
+            warning = self.plugin._regex_warning(new_keyword, self._regex_flags())
+            if warning:
+                yield event.plain_result(f"提示：{warning}。")
         
-        if 0 <= idx < len(self.plugin.data[self.data_key]):
-            old_keyword = self.plugin.data[self.data_key][idx]["keyword"]
-            self.plugin.data[self.data_key][idx]["keyword"] = new_keyword
-            self.plugin.data[self.data_key][idx]["regex"] = is_regex
+        # 发送提示期间列表可能被其他操作增删，按规则对象重新定位
+        idx = self.index.position_of(cfg)
+        if idx is not None:
+            old_keyword = cfg["keyword"]
+            if old_keyword != new_keyword:
+                self.plugin.regex_cache.invalidate(old_keyword)
+            cfg["keyword"] = new_keyword
+            cfg["regex"] = is_regex
+            self.plugin.index_manager.notify(self.data_key, KEYWORD_CHANGED, idx)
             self.plugin._save_data()
             logger.info(f"编辑关键词: {old_keyword} -> {new_keyword} (操作者: {event.get_sender_id()})")
             yield event.plain_result(f"关键词 '{old_keyword}' 已修改为 '{new_keyword}'。")
@@ -295,7 +288,10 @@ class CommandTriggeredModule:
             deleted_keywords = []
             for idx in indices:
                 cfg = self.plugin.data[self.data_key].pop(idx)
+                self.plugin.index_manager.notify(self.data_key, RULE_REMOVED, idx)
                 deleted_keywords.append(cfg['keyword'])
+                if cfg.get("regex", False):
+                    self.plugin.regex_cache.invalidate(cfg['keyword'])
             
             self.plugin._save_data()
             logger.info(f"删除关键词: {', '.join(deleted_keywords)} (操作者: {event.get_sender_id()})")
@@ -353,11 +349,14 @@ class CommandTriggeredModule:
                         cfg["mode"] = "whitelist"
                         cfg["groups"] = []
                     
+                    members = set(cfg["groups"])
                     for gid in args:
                         if not gid.isdigit():
+                            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
                             yield event.plain_result(f"群号格式错误: {gid}")
                             return
-                        if gid not in cfg["groups"]:
+                        if gid not in members:
+                            members.add(gid)
                             cfg["groups"].append(gid)
                     groups_str = ", ".join(args)
                     cfg["enabled"] = True
@@ -382,15 +381,19 @@ class CommandTriggeredModule:
                         cfg["mode"] = "blacklist"
                         cfg["groups"] = []
                     
+                    members = set(cfg["groups"])
                     for gid in args:
                         if not gid.isdigit():
+                            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
                             yield event.plain_result(f"群号格式错误: {gid}")
                             return
-                        if gid not in cfg["groups"]:
+                        if gid not in members:
+                            members.add(gid)
                             cfg["groups"].append(gid)
                     groups_str = ", ".join(args)
                     cfg["enabled"] = True
 
+            self.plugin.index_manager.notify(self.data_key, GROUPS_CHANGED, idx)
             self.plugin._save_data()
             logger.info(f"修改关键词群聊限制: {cfg['keyword']} -> {cmd_name} {groups_str} (操作者: {event.get_sender_id()})")
             yield event.plain_result(f"关键词 '{cfg['keyword']}' {cmd_name} 群聊: {groups_str}")
@@ -592,7 +595,12 @@ class CommandTriggeredModule:
             return
 
         processed_entry = await self.plugin._process_entry_images(entry)
+        target_idx = self.index.position_of(cfg)
+        if target_idx is None:
+            yield event.plain_result(f"关键词 '{cfg['keyword']}' 已被删除，回复未添加。")
+            return
         cfg["entries"].append(processed_entry)
+        self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, target_idx)
         self.plugin._save_data()
         
         yield event.plain_result(f"已为关键词 '{cfg['keyword']}' 添加新回复（当前共有 {len(cfg['entries'])} 个回复）。")
@@ -682,7 +690,15 @@ class CommandTriggeredModule:
                  return
             
             processed_entry = await self.plugin._process_entry_images(entry)
+            kw_idx = self.index.position_of(cfg)
+            if kw_idx is None:
+                yield event.plain_result(f"关键词 '{cfg['keyword']}' 已被删除，回复未更新。")
+                return
+            if reply_idx >= len(cfg["entries"]):
+                yield event.plain_result("该回复已被删除，请重新查看后再编辑。")
+                return
             cfg["entries"][reply_idx] = processed_entry
+            self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, kw_idx)
             
             self.plugin._save_data()
             logger.info(f"编辑关键词回复: {cfg['keyword']} (序号 {reply_idx+1}) (操作者: {event.get_sender_id()})")
@@ -728,6 +744,7 @@ class CommandTriggeredModule:
             
             if 0 <= reply_idx < len(entries):
                 keyword_cfg["entries"].pop(reply_idx)
+                self.plugin.index_manager.notify(self.data_key, ENTRIES_CHANGED, idx)
                 keyword = keyword_cfg["keyword"]
                 
                 self.plugin._save_data()
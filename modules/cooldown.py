@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import time
+from astrbot.api import logger
+
+# 冷却范围：键中带有哪些维度决定了冷却互相影响的范围
+SCOPE_SESSION = "session"            # 同一会话内所有检测词共享冷却（原有行为）
+SCOPE_SESSION_RULE = "session_rule"  # 同一会话内按检测词分别冷却
+SCOPE_SESSION_USER = "session_user"  # 同一会话内按发送者分别冷却
+SCOPE_RULE = "rule"                  # 检测词在所有会话中共享冷却
+COOLDOWN_SCOPES = {
+    SCOPE_SESSION: "会话",
+    SCOPE_SESSION_RULE: "会话 + 检测词",
+    SCOPE_SESSION_USER: "会话 + 用户",
+    SCOPE_RULE: "检测词（全局）",
+}
+DEFAULT_SCOPES = (SCOPE_SESSION,)
+
+
+def parse_cooldown(value, keyword: str = ""):
+    """把规则配置中的冷却时长转为秒数，未设置或无效时返回 None（使用全局冷却）。
+    手动编辑的配置中可能是 "5" 这样的字符串，无法识别的值记录警告后忽略。
+    """
+    if value is None:
+        return None
+    raw = value
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            value = None
+        else:
+            if value.is_integer():
+                value = int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value or value < 0:
+        logger.warning(f"检测词 '{keyword}' 的冷却时长无效，已改用全局冷却: {raw!r}")
+        return None
+    return value
+
+
+def cooldown_keys(scopes, session_id, user_id, rule_id) -> tuple:
+    """按规则配置的冷却范围生成冷却键，未知范围忽略。
+    rule_id 标识规则本身（而非关键词文本），关键词相同的不同规则互不影响。
+    """
+    keys = []
+    for scope in scopes:
+        if scope == SCOPE_SESSION:
+            keys.append((scope, session_id))
+        elif scope == SCOPE_SESSION_RULE:
+            keys.append((scope, session_id, rule_id))
+        elif scope == SCOPE_SESSION_USER:
+            keys.append((scope, session_id, user_id))
+        elif scope == SCOPE_RULE:
+            keys.append((scope, rule_id))
+    return tuple(keys)
+
+
+class CooldownStore:
+    """带过期清理的冷却记录。
+
+    每个键只保存最后一次触发的时间，是否仍在冷却由查询的规则按自己的冷却时长判断，
+    共享同一个键（如默认的会话范围）时，冷却较长的规则不会让冷却较短的规则一起静默。
+    触发时间同时放入小顶堆，超过目前见过的最长冷却时长后在写入时清理，内存只与冷却期内活跃的会话数有关。
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._last = {}       # 键 -> 最后触发时间
+        self._heap = []       # (触发时间, 序号, 键)，键被覆盖后旧条目在清理时跳过
+        self._counter = itertools.count()  # 触发时间相同时按序号排序，避免比较键
+        self.retention = 0    # 见过的最长冷却时长，触发记录至少保留这么久
+        self.hits = 0         # 处于冷却中而被拦截的次数
+        self.started = 0      # 开始冷却的次数
+        self.expired = 0      # 过期清理的键数
+
+    def __len__(self):
+        return len(self._last)
+
+    def now(self) -> float:
+        return self._clock()
+
+    def remaining(self, key, duration: float, now: float = None) -> float:
+        """按 duration 秒的冷却返回剩余秒数，不在冷却中返回 0，处于冷却中时计入命中次数"""
+        return self.remaining_any((key,), duration, now)
+
+    def remaining_any(self, keys, duration: float, now: float = None) -> float:
+        """按 duration 秒的冷却返回多个键中最长的剩余秒数，任一键处于冷却中时计入一次命中"""
+        if now is None:
+            now = self._clock()
+        if duration > self.retention:
+            self.retention = duration
+        last = self._last
+        triggered = max((last[key] for key in keys if key in last), default=None)
+        if triggered is None:
+            return 0
+        left = triggered + duration - now
+        if left <= 0:
+            return 0
+        self.hits += 1
+        return left
+
+    def start(self, key, duration: float, now: float = None):
+        """记录一次触发，duration 为触发的规则的冷却时长"""
+        if now is None:
+            now = self._clock()
+        if duration > self.retention:
+            self.retention = duration
+        self.sweep(now)
+        self._last[key] = now
+        heapq.heappush(self._heap, (now, next(self._counter), key))
+        self.started += 1
+        # 同一个键被反复覆盖时堆里会积累旧条目，超过一定比例后重建
+        if len(self._heap) > 2 * len(self._last) + 64:
+            self._heap = [(t, next(self._counter), k) for k, t in self._last.items()]
+            heapq.heapify(self._heap)
+
+    def sweep(self, now: float = None) -> int:
+        """清理距最后触发已超过最长冷却时长的键，返回清理数量"""
+        if now is None:
+            now = self._clock()
+        heap = self._heap
+        last = self._last
+        cutoff = now - self.retention
+        removed = 0
+        while heap and heap[0][0] <= cutoff:
+            triggered, _, key = heapq.heappop(heap)
+            if last.get(key) == triggered:
+                del last[key]
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def clear(self):
+        self._last.clear()
+        self._heap.clear()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._last),
+            "hits": self.hits,
+            "started": self.started,
+            "expired": self.expired,
+        }
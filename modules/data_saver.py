@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from astrbot.api import logger
+from .lazy_entries import LazyEntries, json_default
+
+
+def snapshot_json(obj):
+    """复制 JSON 结构（dict/list 递归复制，其余为不可变值直接共享），比 copy.deepcopy 快得多"""
+    if isinstance(obj, dict):
+        return {key: snapshot_json(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [snapshot_json(value) for value in obj]
+    if isinstance(obj, LazyEntries):
+        # 未加载的回复条目只复制偏移，写入时再从存储文件读取
+        return snapshot_json(obj.to_list()) if obj.resident else obj.detached()
+    return obj
+
+
+# 进程的 umask 只能通过设置来读取，在导入时读取一次，避免写入线程中临时修改影响其他线程创建的文件
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _target_mode(path: str) -> int:
+    """替换后文件应有的权限：沿用已有文件的权限，新文件与 open() 创建时一致"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write_json(path: str, data):
+    """先写入同目录的临时文件并 fsync，再原子替换目标文件，写入中途崩溃不会留下截断的文件。
+    mkstemp 创建的临时文件权限为 0600，替换前改为目标文件原有的权限。
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".keywords-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _target_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # 同步目录项，确保重命名本身也已落盘（Windows 不支持打开目录，跳过）
+    if hasattr(os, "O_DIRECTORY"):
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+
+class DebouncedSaver:
+    """延迟合并、在后台线程写入的数据保存器。
+
+    每次修改只标记为脏，等待 delay 秒内没有新的修改后再写入；
+    持续有修改时最迟 max_delay 秒写入一次。批量操作（如 /启用检测词 1-200）只落盘一次。
+    写入前先在事件循环中取快照，序列化与写文件交给单线程执行器，按提交顺序依次完成，
+    之后对数据的修改不会影响正在写入的副本。
+    不在事件循环中调用（如插件加载阶段）时直接同步写入。
+    """
+
+    def __init__(self, snapshot, write, delay: float = 0.5, max_delay: float = 3.0):
+        self._snapshot = snapshot
+        self._write = write
+        self.delay = max(0.0, delay)
+        self.max_delay = max(self.delay, max_delay)
+        self._pending = 0          # 上次写入后累计的修改次数
+        self._first_dirty = None   # 首次标记为脏的时间（事件循环时钟）
+        self._timer = None
+        self._executor = None
+        self._inflight = set()     # 尚未完成的后台写入
+        self.requests = 0          # 请求保存的总次数
+        self.writes = 0            # 实际写入次数
+        self.coalesced = 0         # 被合并掉的写入次数
+
+    @property
+    def dirty(self) -> bool:
+        return self._pending > 0
+
+    def mark_dirty(self):
+        self.requests += 1
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if not self.delay:
+            self._flush_in_background()
+            return
+        now = loop.time()
+        if self._first_dirty is None:
+            self._first_dirty = now
+        if self._timer is not None:
+            self._timer.cancel()
+        wait = min(self.delay, self._first_dirty + self.max_delay - now)
+        self._timer = loop.call_later(max(0.0, wait), self._flush_in_background)
+
+    def _take_pending(self) -> bool:
+        """取消定时器并结算本轮合并的修改，没有修改时返回 False"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._first_dirty = None
+        if not self._pending:
+            return False
+        pending, self._pending = self._pending, 0
+        self.coalesced += pending - 1
+        self.writes += 1
+        return True
+
+    def _safe_write(self, snapshot):
+        try:
+            self._write(snapshot)
+        except Exception as e:
+            logger.error(f"保存关键词数据失败: {e}")
+
+    def _flush_in_background(self):
+        if not self._take_pending():
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keywords-save")
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._safe_write, self._snapshot())
+        self._inflight.add(future)
+        future.add_done_callback(self._inflight.discard)
+
+    def flush(self) -> bool:
+        """在当前线程立即写入尚未保存的修改，没有修改时返回 False"""
+        if not self._take_pending():
+            return False
+        self._safe_write(self._snapshot())
+        return True
+
+    async def aflush(self):
+        """提交尚未保存的修改并等待所有后台写入完成"""
+        self._flush_in_background()
+        if self._inflight:
+            await asyncio.gather(*self._inflight)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "writes": self.writes, "coalesced": self.coalesced}
@@ -0,0 +1,158 @@
+import json
+import mmap
+import os
+from collections.abc import MutableSequence
+from copy import deepcopy
+from .matcher import LRUCache
+
+
+class LazyEntries(MutableSequence):
+    """按需加载的回复条目列表，放在规则配置的 entries 中代替普通列表。
+
+    未加载时只保存条目在存储文件中的偏移、长度与条目数，len() 不触发加载；
+    读取时经 EntryStore 的 LRU 缓存解析，任何修改都会先把条目复制为常驻列表，之后与普通列表无异。
+    """
+
+    __slots__ = ("_store", "_offset", "_length", "_count", "_items")
+
+    def __init__(self, store: "EntryStore", offset: int, length: int, count: int):
+        self._store = store
+        self._offset = offset
+        self._length = length
+        self._count = count
+        self._items = None  # 被修改后转为常驻的条目
+
+    @property
+    def resident(self) -> bool:
+        return self._items is not None
+
+    def _view(self) -> list:
+        if self._items is not None:
+            return self._items
+        return self._store.read(self._offset, self._length)
+
+    def _materialize(self) -> list:
+        if self._items is None:
+            self._items = list(self._store.read(self._offset, self._length))
+        return self._items
+
+    def __len__(self):
+        return self._count if self._items is None else len(self._items)
+
+    def __getitem__(self, index):
+        return self._view()[index]
+
+    def __iter__(self):
+        return iter(self._view())
+
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self._materialize()[index]
+
+    def insert(self, index, value):
+        self._materialize().insert(index, value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyEntries):
+            other = other.to_list()
+        return isinstance(other, list) and self.to_list() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        state = "常驻" if self.resident else f"未加载 @{self._offset}"
+        return f"LazyEntries({len(self)} 条, {state})"
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.to_list(), memo)
+
+    def to_list(self) -> list:
+        """返回全部条目，未加载时直接从存储文件读取、不经过缓存（可在后台线程调用）"""
+        if self._items is not None:
+            return self._items
+        return self._store.read(self._offset, self._length, cache=False)
+
+    def detached(self) -> "LazyEntries":
+        """未加载时返回指向同一段数据的新对象，供保存时的快照使用，之后对原对象的修改不会影响它"""
+        return LazyEntries(self._store, self._offset, self._length, self._count)
+
+
+def json_default(obj):
+    """json.dump 的 default 钩子，把 LazyEntries 写成普通列表"""
+    if isinstance(obj, LazyEntries):
+        return obj.to_list()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class EntryStore:
+    """回复条目的只读存储文件（keywords.entries.bin）。
+
+    加载数据后把每条规则的 entries 依次序列化写入文件，内存中只保留 LazyEntries 偏移，
+    规则触发或 WebUI 打开时通过内存映射读取并解析，最近用过的规则条目保留在容量固定的 LRU 中。
+    文件在每次启动时重新生成，只是 keywords.json 等持久化数据的副本。
+    """
+
+    def __init__(self, path: str, cache_size: int):
+        self.path = path
+        self._cache = LRUCache(cache_size)
+        self._file = None
+        self._mmap = None
+        self.count = 0  # 移出内存的规则数
+        self.size = 0   # 存储文件大小（字节）
+
+    def build(self, data: dict) -> int:
+        """把所有规则的回复条目写入存储文件并替换为 LazyEntries，返回移出内存的规则数"""
+        self.close()
+        placed = []
+        offset = 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for rules in data.values():
+                for cfg in rules:
+                    entries = cfg.get("entries")
+                    if not isinstance(entries, list) or not entries:
+                        continue
+                    blob = json.dumps(entries, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                    f.write(blob)
+                    placed.append((cfg, offset, len(blob), len(entries)))
+                    offset += len(blob)
+        os.replace(tmp_path, self.path)
+        if not placed:
+            return 0
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        for cfg, start, length, count in placed:
+            cfg["entries"] = LazyEntries(self, start, length, count)
+        self.count = len(placed)
+        self.size = offset
+        return self.count
+
+    def read(self, offset: int, length: int, cache: bool = True) -> list:
+        if cache:
+            items = self._cache.get(offset)
+            if items is not None:
+                return items
+        items = json.loads(self._mmap[offset:offset + length])
+        if cache:
+            self._cache.put(offset, items)
+        return items
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "size": self.size,
+            "cached": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+        }
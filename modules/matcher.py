@@ -0,0 +1,250 @@
+import re
+import unicodedata
+from collections import OrderedDict, deque
+from astrbot.api import logger
+from .regex_backend import compile_pattern
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+_REPEAT_OPS = tuple(
+    op for op in (
+        sre_constants.MAX_REPEAT,
+        sre_constants.MIN_REPEAT,
+        getattr(sre_constants, "POSSESSIVE_REPEAT", None),
+    ) if op is not None
+)
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+
+def _fold_safe(ch: str) -> bool:
+    """忽略大小写时，该字符能否用 str.lower() 精确判断是否出现。
+    i/k/s 在 Unicode 下还会匹配 ı、K、ſ 等字符，非 ASCII 的大小写字母同理，统一视为不安全。
+    """
+    if ch.lower() == ch.upper():
+        return True
+    return ch.isascii() and ch.lower() not in "iks"
+
+
+def _collect_literals(subpattern, ignore_case: bool, out: list):
+    """收集一段顺序表达式中必然出现的连续字面量"""
+    run = []
+
+    def flush():
+        if run:
+            out.append("".join(run))
+            run.clear()
+
+    for op, av in subpattern:
+        if op is sre_constants.LITERAL:
+            ch = chr(av)
+            if ignore_case and not _fold_safe(ch):
+                flush()
+                continue
+            run.append(ch.lower() if ignore_case else ch)
+            continue
+
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            add_flags, del_flags = av[1], av[2]
+            if (add_flags | del_flags) & re.IGNORECASE:
+                continue
+            _collect_literals(av[-1], ignore_case, out)
+        elif op in _REPEAT_OPS:
+            if av[0] >= 1:
+                _collect_literals(av[2], ignore_case, out)
+        elif op is _ATOMIC_GROUP:
+            _collect_literals(av, ignore_case, out)
+    flush()
+
+
+def required_literal(pattern: str, flags: int = 0) -> str:
+    """提取正则任意匹配中都必须出现的最长字面量，提取不到时返回空字符串。
+    忽略大小写时返回小写形式，应与 text.lower() 比较。
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return ""
+    ignore_case = bool((flags | parsed.state.flags) & re.IGNORECASE)
+    literals = []
+    _collect_literals(parsed, ignore_case, literals)
+    return max(literals, key=len, default="")
+
+
+class MessageText:
+    """单条消息的规范化文本，在 on_message 中构建一次，供关键词与检测词模块共享"""
+
+    __slots__ = ("raw", "text", "lowered", "first_token", "first_token_lowered")
+
+    def __init__(self, message_str: str, nfkc: bool = False):
+        self.raw = message_str.strip()
+        self.text = normalize_text(self.raw, nfkc)
+        self.lowered = self.text.lower()
+        parts = self.text.split(None, 1)
+        self.first_token = parts[0] if parts else ""
+        self.first_token_lowered = self.first_token.lower()
+
+
+def normalize_text(text: str, nfkc: bool = False) -> str:
+    """可选的 NFKC 规范化（全角转半角、兼容字符归一），消息与非正则关键词需使用同一规则"""
+    return unicodedata.normalize("NFKC", text) if nfkc else text
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机，一次扫描即可找出文本中出现的所有模式"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [()]
+        self._out = [()]
+        self._built = True
+
+    def add(self, pattern: str, value):
+        """添加模式串，命中时返回 value"""
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append(())
+            node = nxt
+        self._own[node] = self._own[node] + (value,)
+        self._built = False
+
+    def build(self):
+        """计算失配指针，并沿失配链合并输出"""
+        goto, fail = self._goto, self._fail
+        out = self._out = list(self._own)
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+        self._built = True
+
+    def search(self, text: str) -> set:
+        """返回文本中出现的所有模式对应的 value 集合"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = set()
+        if len(goto) == 1:
+            return hits
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+        return hits
+
+
+class LRUCache:
+    """容量固定的最近最少使用缓存，maxsize 为 0 时不缓存"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class RegexCache:
+    """插件自有的正则编译缓存，按 (正则, flags) 保存编译结果，避免依赖 re 模块容量有限的内部缓存。
+    开启 use_re2 时优先使用 RE2 引擎，不支持的正则回退到 re，并记录每条正则实际使用的引擎。
+    """
+
+    def __init__(self, use_re2: bool = False):
+        self.use_re2 = use_re2
+        self._patterns = {}
+        self._backends = {}  # (正则, flags) -> (引擎, 未使用 RE2 的原因)
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def _compile(self, key: tuple):
+        compiled, backend, reason = compile_pattern(key[0], key[1], self.use_re2)
+        self._patterns[key] = compiled
+        self._backends[key] = (backend, reason)
+        return compiled
+
+    def compile(self, pattern: str, flags: int = 0):
+        """编译并缓存正则，语法错误时抛出 re.error，用于添加/编辑时的校验"""
+        key = (pattern, flags)
+        compiled = self._patterns.get(key)
+        if compiled is None:
+            compiled = self._compile(key)
+        return compiled
+
+    def get(self, pattern: str, flags: int = 0):
+        """获取编译结果，无效正则只记录一次错误并返回 None"""
+        key = (pattern, flags)
+        try:
+            return self._patterns[key]
+        except KeyError:
+            pass
+        try:
+            return self._compile(key)
+        except re.error as e:
+            logger.error(f"正则表达式编译失败 (关键词: {pattern}): {e}")
+            self._patterns[key] = None
+            self._backends[key] = (None, str(e))
+            return None
+
+    def backend(self, pattern: str, flags: int = 0) -> tuple:
+        """返回 (实际使用的引擎, 未使用 RE2 的原因)，无效正则的引擎为 None"""
+        self.get(pattern, flags)
+        return self._backends[(pattern, flags)]
+
+    def invalidate(self, pattern: str):
+        """移除某个正则在所有 flags 下的编译结果"""
+        for key in [k for k in self._patterns if k[0] == pattern]:
+            del self._patterns[key]
+            self._backends.pop(key, None)
+
+    def clear(self):
+        self._patterns.clear()
+        self._backends.clear()
@@ -0,0 +1,170 @@
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+try:
+    import re2
+except ImportError:  # 未安装 google-re2 时只使用 re
+    re2 = None
+
+BACKEND_RE = "re"
+BACKEND_RE2 = "re2"
+
+# RE2 的 \d \w \s 只匹配 ASCII，翻译时换成与 Python 一致的 Unicode 写法
+_DIGIT = r"\p{Nd}"
+_WORD = r"\p{L}\p{N}_"
+_SPACE = r"\t-\r\x{1c}-\x{20}\x{85}\x{a0}\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}"
+_CLASS_ITEMS = {
+    sre_constants.CATEGORY_DIGIT: _DIGIT,
+    sre_constants.CATEGORY_WORD: _WORD,
+    sre_constants.CATEGORY_SPACE: _SPACE,
+}
+_NEGATED_CLASSES = {
+    sre_constants.CATEGORY_NOT_DIGIT: _DIGIT,
+    sre_constants.CATEGORY_NOT_WORD: _WORD,
+    sre_constants.CATEGORY_NOT_SPACE: _SPACE,
+}
+_ANCHORS = {
+    sre_constants.AT_BEGINNING: "^",
+    sre_constants.AT_BEGINNING_STRING: r"\A",
+    sre_constants.AT_END: "$",
+    sre_constants.AT_END_STRING: r"\z",
+}
+_INLINE_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+_SUPPORTED_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.UNICODE | re.VERBOSE
+_MAX_RE2_REPEAT = 1000
+
+
+class Unsupported(Exception):
+    """正则含有 RE2 不支持或语义不同的写法，异常信息为原因"""
+
+
+def _char(code: int, in_class: bool = False) -> str:
+    ch = chr(code)
+    if ch.isalnum() and ch.isprintable():
+        return ch
+    if not in_class and code < 128 and ch.isprintable() and ch not in "\\.^$|?*+()[]{}":
+        return ch
+    return "\\x{%x}" % code
+
+
+def _translate_class(items) -> str:
+    negate = False
+    parts = []
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            parts.append(_char(av, True))
+        elif op is sre_constants.RANGE:
+            parts.append(f"{_char(av[0], True)}-{_char(av[1], True)}")
+        elif op is sre_constants.CATEGORY and av in _CLASS_ITEMS:
+            parts.append(_CLASS_ITEMS[av])
+        elif op is sre_constants.CATEGORY and av in _NEGATED_CLASSES and len(items) == 1:
+            return f"[^{_NEGATED_CLASSES[av]}]"
+        else:
+            raise Unsupported("字符类中混用了 \\D \\W \\S 等取反写法")
+    return f"[{'^' if negate else ''}{''.join(parts)}]"
+
+
+def _translate_seq(subpattern, names: dict) -> str:
+    return "".join(_translate_node(op, av, names) for op, av in subpattern)
+
+
+def _translate_node(op, av, names: dict) -> str:
+    if op is sre_constants.LITERAL:
+        return _char(av)
+    if op is sre_constants.NOT_LITERAL:
+        return f"[^{_char(av, True)}]"
+    if op is sre_constants.ANY:
+        return "."
+    if op is sre_constants.IN:
+        return _translate_class(av)
+    if op is sre_constants.AT:
+        if av not in _ANCHORS:
+            raise Unsupported("RE2 的 \\b \\B 只识别 ASCII 单词边界")
+        return _ANCHORS[av]
+    if op is sre_constants.BRANCH:
+        return "(?:" + "|".join(_translate_seq(alt, names) for alt in av[1]) + ")"
+    if op is sre_constants.SUBPATTERN:
+        group, add_flags, del_flags, body = av
+        if (add_flags | del_flags) & ~_SUPPORTED_FLAGS:
+            raise Unsupported("使用了 RE2 不支持的内联标志")
+        inner = _translate_seq(body, names)
+        add = "".join(c for flag, c in _INLINE_FLAGS if add_flags & flag)
+        remove = "".join(c for flag, c in _INLINE_FLAGS if del_flags & flag)
+        if add or remove:
+            inner = f"(?{add}{'-' + remove if remove else ''}:{inner})"
+        if group is None:
+            return f"(?:{inner})"
+        name = names.get(group)
+        return f"(?P<{name}>{inner})" if name else f"({inner})"
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        min_count, max_count, body = av
+        if min_count > _MAX_RE2_REPEAT or (max_count != sre_constants.MAXREPEAT and max_count > _MAX_RE2_REPEAT):
+            raise Unsupported(f"RE2 的重复次数上限为 {_MAX_RE2_REPEAT}")
+        if max_count == sre_constants.MAXREPEAT:
+            quantifier = {0: "*", 1: "+"}.get(min_count, f"{{{min_count},}}")
+        elif (min_count, max_count) == (0, 1):
+            quantifier = "?"
+        elif min_count == max_count:
+            quantifier = f"{{{min_count}}}"
+        else:
+            quantifier = f"{{{min_count},{max_count}}}"
+        if op is sre_constants.MIN_REPEAT:
+            quantifier += "?"
+        return f"(?:{_translate_seq(body, names)}){quantifier}"
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        raise Unsupported("RE2 不支持前瞻/后顾断言")
+    if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+        raise Unsupported("RE2 不支持反向引用")
+    raise Unsupported("RE2 不支持原子组或占有量词")
+
+
+def translate_to_re2(pattern: str, flags: int = 0) -> str:
+    """把 Python 正则翻译为语义一致的 RE2 正则，无法翻译时抛出 Unsupported"""
+    parsed = sre_parse.parse(pattern, flags)
+    all_flags = flags | parsed.state.flags
+    if all_flags & ~_SUPPORTED_FLAGS:
+        raise Unsupported("使用了 RE2 不支持的标志")
+    names = {gid: name for name, gid in parsed.state.groupdict.items()}
+    prefix = "".join(c for flag, c in _INLINE_FLAGS if all_flags & flag)
+    body = _translate_seq(parsed, names)
+    return f"(?{prefix}){body}" if prefix else body
+
+
+class Re2Pattern:
+    """RE2 编译结果，对外提供与 re.Pattern 相同的 pattern/flags/search/fullmatch"""
+
+    __slots__ = ("pattern", "flags", "translated", "search", "fullmatch")
+
+    def __init__(self, compiled: re.Pattern, translated: str):
+        options = re2.Options()
+        options.log_errors = False
+        regex = re2.compile(translated, options)
+        self.pattern = compiled.pattern
+        self.flags = compiled.flags
+        self.translated = translated
+        self.search = regex.search
+        self.fullmatch = regex.fullmatch
+
+
+def compile_pattern(pattern: str, flags: int = 0, use_re2: bool = False):
+    """编译正则，返回 (编译结果, 引擎, 未使用 RE2 的原因)。语法错误时抛出 re.error。
+    开启 RE2 时优先使用线性时间的 RE2，含有 RE2 不支持的写法时回退到 re。
+    """
+    compiled = re.compile(pattern, flags)
+    if not use_re2:
+        return compiled, BACKEND_RE, ""
+    if re2 is None:
+        return compiled, BACKEND_RE, "未安装 google-re2"
+    try:
+        return Re2Pattern(compiled, translate_to_re2(pattern, flags)), BACKEND_RE2, ""
+    except Unsupported as e:
+        return compiled, BACKEND_RE, str(e)
+    except Exception as e:
+        return compiled, BACKEND_RE, f"RE2 编译失败: {e}"
@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from astrbot.api import logger
+from .regex_backend import Re2Pattern
+
+# 工作进程内的编译缓存，键为 (正则, flags)
+_worker_patterns = {}
+# 工作进程内的进度槽位：(槽位号, 任务号数组, 进度数组)，超时时主进程据此找出正在执行的正则
+_worker_progress = None
+
+
+def _init_worker(counter, jobs, positions):
+    global _worker_progress
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    if slot < len(jobs):
+        _worker_progress = (slot, jobs, positions)
+
+
+def _run_batch(method: str, patterns: list, text: str, stop_at_first: bool, job: int = 0) -> list:
+    """在工作进程中依次执行一批正则。
+    返回与 patterns 等长（stop_at_first 时截止到首个命中）的结果列表，
+    未命中为 None，命中为 (group(0), *groups()) 元组。
+    执行每条正则前把任务号与序号写入本进程的进度槽位。
+    """
+    progress = _worker_progress if job else None
+    results = []
+    try:
+        for i, key in enumerate(patterns):
+            if progress is not None:
+                slot, jobs, positions = progress
+                positions[slot] = i
+                jobs[slot] = job
+            compiled = _worker_patterns.get(key)
+            if compiled is None:
+                compiled = _worker_patterns[key] = re.compile(*key)
+            match = getattr(compiled, method)(text)
+            if match is None:
+                results.append(None)
+                continue
+            results.append((match.group(0),) + match.groups())
+            if stop_at_first:
+                break
+    finally:
+        if progress is not None:
+            progress[1][progress[0]] = 0
+    return results
+
+
+class RemoteMatch:
+    """工作进程返回的匹配结果，提供与 re.Match 相同的 group 接口"""
+
+    __slots__ = ("_groups",)
+
+    def __init__(self, groups: tuple):
+        self._groups = groups
+
+    def group(self, index: int = 0):
+        return self._groups[index]
+
+    def __bool__(self):
+        return True
+
+
+class RegexPool:
+    """在独立进程池中执行正则，为每条消息设置硬性时间上限。
+
+    超时的正则视为未命中并记录，随后终止并重建进程池，
+    避免单个灾难性回溯的正则卡住整个 AstrBot 事件循环。
+    """
+
+    def __init__(self, timeout_ms: int, workers: int = 2):
+        self.timeout = timeout_ms / 1000
+        self.workers = max(1, workers)
+        self.timeout_count = 0
+        self.failure_count = 0  # 超时与进程池不可用的总次数，期间的结果不可缓存
+        self.timeouts = {}  # 正则 -> 超时次数，只记在超时时正在执行的那条正则上
+        self._executor = None
+        self._progress = None  # 当前进程池的 (任务号数组, 进度数组)，每个工作进程一个槽位
+        self._jobs = itertools.count(1)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            jobs = multiprocessing.RawArray("q", self.workers)
+            positions = multiprocessing.RawArray("q", self.workers)
+            self._progress = (jobs, positions)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(multiprocessing.Value("i", 0), jobs, positions),
+            )
+        return self._executor
+
+    @staticmethod
+    def _running_index(progress: tuple, job: int):
+        """返回任务中正在执行的正则序号，任务尚未开始执行（排在其他卡住的任务之后）时返回 None"""
+        jobs, positions = progress
+        for slot in range(len(jobs)):
+            if jobs[slot] == job:
+                return positions[slot]
+        return None
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """卡在回溯中的任务无法取消，只能终止工作进程后重建进程池"""
+        if self._executor is executor:
+            self._executor = None
+        terminate = getattr(executor, "terminate_workers", None)
+        if terminate is not None:
+            terminate()
+        else:
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, method: str, patterns: list, text: str, stop_at_first: bool = False) -> list:
+        """在截止时间内执行一批正则，patterns 为编译后的 Pattern 列表。
+        RE2 编译的正则是线性时间，直接在主进程执行，只有 re 正则交给进程池。
+        超时或进程池异常时返回全部未命中。
+        """
+        results = [None] * len(patterns)
+        remote = []
+        for i, pattern in enumerate(patterns):
+            if not isinstance(pattern, Re2Pattern):
+                remote.append(i)
+                continue
+            results[i] = getattr(pattern, method)(text)
+            if stop_at_first and results[i]:
+                # 排在首个 RE2 命中之后的正则不可能被选中
+                remote = [j for j in remote if j < i]
+                break
+        if remote:
+            remote_results = await self._run_remote(method, [patterns[i] for i in remote], text, stop_at_first)
+            for i, match in zip(remote, remote_results):
+                results[i] = match
+        return results
+
+    async def _run_remote(self, method: str, patterns: list, text: str, stop_at_first: bool) -> list:
+        keys = [(p.pattern, p.flags) for p in patterns]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        for attempt in range(2):
+            executor = self._get_executor()
+            progress = self._progress
+            job = next(self._jobs)
+            try:
+                future = executor.submit(_run_batch, method, keys, text, stop_at_first, job)
+                results = await asyncio.wait_for(asyncio.wrap_future(future), max(0, deadline - loop.time()))
+                return [RemoteMatch(r) if r is not None else None for r in results]
+            except asyncio.TimeoutError:
+                self.timeout_count += 1
+                self.failure_count += 1
+                running = self._running_index(progress, job)
+                if running is None:
+                    logger.warning(
+                        f"正则匹配超时 ({self.timeout * 1000:.0f}ms)，工作进程被其他正则占用，本条消息的正则规则视为未命中"
+                    )
+                else:
+                    pattern = keys[running][0]
+                    self.timeouts[pattern] = self.timeouts.get(pattern, 0) + 1
+                    logger.warning(
+                        f"正则匹配超时 ({self.timeout * 1000:.0f}ms)，本条消息的正则规则视为未命中，"
+                        f"超时的正则: {pattern}"
+                    )
+                self._recycle(executor)
+                return [None] * len(keys)
+            except BrokenProcessPool:
+                # 进程池被其他消息的超时重建，剩余时间内重试一次
+                if self._executor is executor:
+                    self._executor = None
+                if attempt or deadline <= loop.time():
+                    self.failure_count += 1
+                    logger.warning("正则进程池不可用，本条消息的正则规则视为未命中")
+                    return [None] * len(keys)
+        return [None] * len(keys)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._recycle(self._executor)
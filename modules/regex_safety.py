@@ -0,0 +1,255 @@
+import re
+from .matcher import sre_parse, sre_constants
+
+MAX_PATTERN_LENGTH = 100
+# 可选次数跨度达到该值的有界重复与无界重复同样视为循环；主体可变长的重复不论次数都视为循环
+_LOOP_SPAN = 10
+
+_MAXREPEAT = sre_constants.MAXREPEAT
+_BACKTRACK_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_POSSESSIVE_REPEAT = getattr(sre_constants, "POSSESSIVE_REPEAT", None)
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+# 判断两个字符集是否相交时使用的样本字符，另外会补充两侧出现过的字面量与区间端点
+_SAMPLE_CHARS = tuple(range(256)) + (0x3000, 0x4E00, 0x7B7E, 0xFF01, 0xFF10, 0x1F600)
+
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: lambda ch: ch.isdecimal(),
+    sre_constants.CATEGORY_NOT_DIGIT: lambda ch: not ch.isdecimal(),
+    sre_constants.CATEGORY_SPACE: lambda ch: ch.isspace(),
+    sre_constants.CATEGORY_NOT_SPACE: lambda ch: not ch.isspace(),
+    sre_constants.CATEGORY_WORD: lambda ch: ch.isalnum() or ch == "_",
+    sre_constants.CATEGORY_NOT_WORD: lambda ch: not (ch.isalnum() or ch == "_"),
+}
+
+
+class UnsafeRegex(Exception):
+    """正则存在灾难性回溯风险，异常信息为原因说明"""
+
+
+# 相邻重复只会造成多项式级回溯（如 .*(\d+).*），实际使用中很常见，只提示不拒绝
+POLYNOMIAL_WARNING = "相邻的重复可以匹配相同的字符（如 \\d+\\d+、.*.*），超长文本下回溯次数呈多项式增长"
+
+
+class _Info:
+    """子表达式的分析结果"""
+
+    __slots__ = ("nullable", "first", "last", "chars", "heads", "tails", "loops", "ambiguous")
+
+    def __init__(self, nullable=True, first=frozenset(), last=None, chars=None, heads=(), tails=(),
+                 loops=(), ambiguous=False):
+        self.nullable = nullable                          # 能否匹配空串
+        self.first = first                                # 可能的首字符
+        self.last = first if last is None else last       # 可能的末字符
+        self.chars = first if chars is None else chars    # 可能消耗的全部字符
+        self.heads = heads          # 开头处（前面只有可空部分）的循环所消耗的字符
+        self.tails = tails          # 结尾处（后面只有可空部分）的循环所消耗的字符
+        self.loops = loops          # 内部所有可变长部分（可回溯的重复）所消耗的字符
+        self.ambiguous = ambiguous  # 是否含有首字符相交的分支
+
+
+def _atom_matches(atom, ch: str) -> bool:
+    kind = atom[0]
+    if kind == "any":
+        return ch != "\n"
+    if kind == "lit":
+        return ord(ch) == atom[1]
+    if kind == "not":
+        return ord(ch) != atom[1]
+    # kind == "in"
+    negate = False
+    hit = False
+    for op, av in atom[1]:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            hit = hit or ord(ch) == av
+        elif op is sre_constants.RANGE:
+            hit = hit or av[0] <= ord(ch) <= av[1]
+        elif op is sre_constants.CATEGORY:
+            test = _CATEGORIES.get(av)
+            hit = hit or test is None or test(ch)
+    return hit != negate
+
+
+def _set_matches(atoms, ch: str) -> bool:
+    for atom in atoms:
+        variants = (ch, ch.lower(), ch.upper()) if atom[-1] else (ch,)
+        if any(len(v) == 1 and _atom_matches(atom, v) for v in variants):
+            return True
+    return False
+
+
+def _sample(atoms, out: set):
+    for atom in atoms:
+        if atom[0] in ("lit", "not"):
+            out.add(atom[1])
+        elif atom[0] == "in":
+            for op, av in atom[1]:
+                if op is sre_constants.LITERAL:
+                    out.add(av)
+                elif op is sre_constants.RANGE:
+                    out.update(av)
+
+
+def _overlaps(a, b) -> bool:
+    """两个字符集合是否可能匹配同一个字符"""
+    if not a or not b:
+        return False
+    samples = set(_SAMPLE_CHARS)
+    _sample(a, samples)
+    _sample(b, samples)
+    for cp in samples:
+        ch = chr(cp)
+        if _set_matches(a, ch) and _set_matches(b, ch):
+            return True
+    return False
+
+
+def _analyze_seq(subpattern, ignore_case: bool, warnings: list) -> _Info:
+    nullable = True
+    first = set()
+    last = set()
+    chars = set()
+    heads = []
+    open_tails = []
+    loops = []
+    ambiguous = False
+    for op, av in subpattern:
+        info = _analyze_node(op, av, ignore_case, warnings)
+        # 相邻的循环之间只隔着可空部分且字符相交时，同一段文本有多种切分方式
+        if POLYNOMIAL_WARNING not in warnings and any(
+            _overlaps(tail, head) for tail in open_tails for head in info.heads
+        ):
+            warnings.append(POLYNOMIAL_WARNING)
+        if nullable:
+            first |= info.first
+            heads.extend(info.heads)
+        nullable = nullable and info.nullable
+        last = (last | info.last) if info.nullable else set(info.last)
+        chars |= info.chars
+        open_tails = (open_tails if info.nullable else []) + list(info.tails)
+        loops.extend(info.loops)
+        ambiguous = ambiguous or info.ambiguous
+    return _Info(nullable, frozenset(first), frozenset(last), frozenset(chars),
+                 tuple(heads), tuple(open_tails), tuple(loops), ambiguous)
+
+
+def _analyze_node(op, av, ignore_case: bool, warnings: list) -> _Info:
+    if op is sre_constants.LITERAL:
+        atoms = frozenset({("lit", av, ignore_case)})
+        return _Info(False, atoms)
+    if op is sre_constants.NOT_LITERAL:
+        atoms = frozenset({("not", av, ignore_case)})
+        return _Info(False, atoms)
+    if op is sre_constants.ANY:
+        atoms = frozenset({("any", ignore_case)})
+        return _Info(False, atoms)
+    if op is sre_constants.IN:
+        atoms = frozenset({("in", tuple(av), ignore_case)})
+        return _Info(False, atoms)
+    if op is sre_constants.AT:
+        return _Info()
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        # 零宽断言不消耗字符，但内部仍可能存在回溯问题
+        _analyze_seq(av[1], ignore_case, warnings)
+        return _Info()
+    if op is sre_constants.GROUPREF:
+        atoms = frozenset({("any", False)})
+        return _Info(True, atoms)
+    if op is sre_constants.SUBPATTERN:
+        add_flags, del_flags, body = av[1], av[2], av[-1]
+        if add_flags & re.IGNORECASE:
+            ignore_case = True
+        if del_flags & re.IGNORECASE:
+            ignore_case = False
+        return _analyze_seq(body, ignore_case, warnings)
+    if op is sre_constants.BRANCH:
+        return _analyze_branch(av[1], ignore_case, warnings)
+    if op is sre_constants.GROUPREF_EXISTS:
+        return _analyze_branch([av[1], av[2] if av[2] is not None else []], ignore_case, warnings)
+    if op is _ATOMIC_GROUP:
+        info = _analyze_seq(av, ignore_case, warnings)
+        # 原子组匹配成功后不再回溯进入内部
+        return _Info(info.nullable, info.first, info.last, info.chars)
+    if op in _BACKTRACK_REPEATS:
+        return _analyze_repeat(av, ignore_case, warnings)
+    if op is _POSSESSIVE_REPEAT:
+        info = _analyze_seq(av[2], ignore_case, warnings)
+        return _Info(av[0] == 0 or info.nullable, info.first, info.last, info.chars)
+    # 未识别的节点按可匹配任意内容处理
+    return _Info(True, frozenset({("any", False)}))
+
+
+def _analyze_branch(alternatives, ignore_case: bool, warnings: list) -> _Info:
+    infos = [_analyze_seq(alt, ignore_case, warnings) for alt in alternatives]
+    # 多个分支都能匹配空串（a|a 解析为 a(?:|)）时，同一段文本同样有多种匹配方式
+    ambiguous = any(info.ambiguous for info in infos) or sum(info.nullable for info in infos) > 1
+    # 两个分支的首字符相交（如 a|ab、a|b|ab）时，重复多次后同一段文本可能有指数级的切分方式
+    for i, info_a in enumerate(infos):
+        if ambiguous:
+            break
+        for info_b in infos[i + 1:]:
+            if _overlaps(info_a.first, info_b.first):
+                ambiguous = True
+                break
+    loops = tuple(l for info in infos for l in info.loops)
+    if any(info.nullable for info in infos) and not all(info.nullable for info in infos):
+        # 含空分支的分支等同于可选部分：sre_parse 会把 a|aa 的公共前缀提出来，解析为 a(?:|a)
+        loops += (frozenset().union(*(info.chars for info in infos)),)
+    return _Info(
+        any(info.nullable for info in infos),
+        frozenset().union(*(info.first for info in infos)),
+        frozenset().union(*(info.last for info in infos)),
+        frozenset().union(*(info.chars for info in infos)),
+        tuple(h for info in infos for h in info.heads),
+        tuple(t for info in infos for t in info.tails),
+        loops,
+        ambiguous,
+    )
+
+
+def _analyze_repeat(av, ignore_case: bool, warnings: list) -> _Info:
+    min_count, max_count, body = av
+    info = _analyze_seq(body, ignore_case, warnings)
+    nullable = min_count == 0 or info.nullable
+    if max_count > 1 and not info.chars:
+        raise UnsafeRegex("量词作用于零宽断言等不消耗字符的表达式，会导致大量无效回溯")
+    # 主体可变长（含可选或重复部分、长短不一的分支）时，固定次数的重复（如 (a?){25}、(.*a){12}）同样会反复回溯
+    variable = bool(info.loops) or info.nullable or info.ambiguous
+    is_loop = max_count > 1 and (max_count == _MAXREPEAT or max_count - min_count >= _LOOP_SPAN or variable)
+    if not is_loop:
+        loops = info.loops + ((info.chars,) if max_count > min_count else ())
+        return _Info(nullable, info.first, info.last, info.chars, info.heads, info.tails, loops, info.ambiguous)
+
+    # 内层可变长部分既能吃掉一次迭代的开头又能吃掉结尾时，迭代边界可以任意移动（星高大于 1）
+    if any(_overlaps(inner, info.first) and _overlaps(inner, info.last) for inner in info.loops):
+        raise UnsafeRegex("存在嵌套量词（如 (a+)+、(\\s*\\w+)*），内外层重复可以匹配相同的文本，会导致灾难性回溯")
+    if info.ambiguous:
+        raise UnsafeRegex("量词作用的分支可以匹配相同的文本（如 (a|a)*、(a|aa)+），会导致灾难性回溯")
+    # 与相邻重复比较时，循环开头只能是迭代的首字符，结尾只能是迭代的末字符
+    return _Info(nullable, info.first, info.last, info.chars,
+                 (info.first,) + info.heads, (info.last,) + info.tails, (info.chars,) + info.loops)
+
+
+def analyze_regex(pattern: str, flags: int = 0, warnings: list = None) -> str:
+    """静态分析正则是否存在灾难性回溯（ReDoS）风险。
+    安全时返回空字符串，否则返回拒绝原因；语法错误交由 re.compile 报告。
+    只有多项式级风险时不拒绝，提示写入 warnings（若提供）。
+    """
+    if warnings is None:
+        warnings = []
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f"正则长度超过 {MAX_PATTERN_LENGTH} 个字符"
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return ""
+    ignore_case = bool((flags | parsed.state.flags) & re.IGNORECASE)
+    try:
+        _analyze_seq(parsed, ignore_case, warnings)
+    except UnsafeRegex as e:
+        return str(e)
+    except RecursionError:
+        return "正则嵌套层数过深"
+    return ""
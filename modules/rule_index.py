@@ -0,0 +1,624 @@
+import asyncio
+import re
+from bisect import bisect_left, insort
+from heapq import merge
+from astrbot.api import logger
+from .matcher import AhoCorasick, LRUCache, MessageText, normalize_text, required_literal
+from .rule_model import GroupMode, Rule
+
+# 规则变更事件，由各修改入口通过 RuleIndexManager.notify 上报
+RULE_ADDED = "added"
+RULE_REMOVED = "removed"
+KEYWORD_CHANGED = "keyword_changed"
+FLAGS_CHANGED = "flags_changed"
+GROUPS_CHANGED = "groups_changed"
+ENTRIES_CHANGED = "entries_changed"  # 只改了回复内容，不影响匹配
+
+# 超过该长度的消息基本不会重复出现，不放入匹配结果缓存
+MEMO_MAX_TEXT_LEN = 64
+
+
+class GroupIndex:
+    """按群号维护生效规则集合，覆盖 enabled 开关与 all/whitelist/blacklist 三种模式"""
+
+    def __init__(self):
+        self._rules = {}         # seq -> Rule，包含停用的规则
+        self._enabled = set()    # 所有启用的规则（私聊不做群聊限制）
+        self._universal = set()  # 启用且默认在所有群生效的规则（all / blacklist）
+        self._whitelist = {}     # group_id -> 白名单包含该群的规则
+        self._blacklist = {}     # group_id -> 黑名单包含该群的规则
+
+    def update(self, seq: int, rule: Rule):
+        """规则的 enabled/mode/groups 变化后增量更新，rule 须是新构建的对象"""
+        self.remove(seq)
+        self.add(seq, rule)
+
+    @property
+    def enabled_count(self) -> int:
+        return len(self._enabled)
+
+    def rules(self):
+        """所有规则（包含停用的）"""
+        return self._rules.values()
+
+    def is_enabled(self, seq: int) -> bool:
+        rule = self._rules.get(seq)
+        return rule is not None and rule.enabled
+
+    def add(self, seq: int, rule: Rule):
+        self._rules[seq] = rule
+        if not rule.enabled:
+            return
+        self._enabled.add(seq)
+        if rule.mode is GroupMode.WHITELIST:
+            for gid in rule.groups:
+                self._whitelist.setdefault(gid, set()).add(seq)
+        else:
+            self._universal.add(seq)
+            if rule.mode is GroupMode.BLACKLIST:
+                for gid in rule.groups:
+                    self._blacklist.setdefault(gid, set()).add(seq)
+
+    def remove(self, seq: int):
+        rule = self._rules.pop(seq, None)
+        if rule is None or not rule.enabled:
+            return
+        self._enabled.discard(seq)
+        self._universal.discard(seq)
+        table = self._whitelist if rule.mode is GroupMode.WHITELIST else self._blacklist
+        for gid in rule.groups:
+            members = table.get(gid)
+            if members is not None:
+                members.discard(seq)
+                if not members:
+                    del table[gid]
+
+    def filter(self, candidates: set, group_id) -> set:
+        """从候选规则中筛出在该群（group_id 为空表示私聊）生效的规则"""
+        if not group_id:
+            return candidates & self._enabled
+        active = candidates & self._universal
+        blocked = self._blacklist.get(group_id)
+        if blocked:
+            active -= blocked
+        allowed = self._whitelist.get(group_id)
+        if allowed:
+            active |= candidates & allowed
+        return active
+
+
+class RuleIndex:
+    """单类规则（关键词或检测词）的匹配索引。
+
+    每条规则分配一个只增不减的序号 seq，追加到列表末尾的规则 seq 最大，按 seq 排序即为列表顺序；
+    删除规则不影响其余规则的 seq，因此单条变更可以直接增量应用，无需重建整个索引。
+    变更无法增量应用时在后台线程完整重建，期间匹配继续使用旧索引；按位置查找规则的入口仍会同步重建。
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.plugin = module.plugin
+        self.data_key = module.data_key
+        self.version = 0
+        self._source = None
+        self._rebuilding = False  # 完整重建期间逐条注册规则
+        self._stale = False       # 有变更未能增量应用，等待完整重建
+        self._changes = 0         # 已上报的变更数，后台重建据此判断期间规则是否又有变化
+        self._rebuild_task = None
+        self._reset()
+
+    def _reset(self):
+        self._seqs = []     # 列表位置 -> seq
+        self._rules = {}    # seq -> Rule，仅包含启用的规则
+        self._next_seq = 0
+        self._by_keyword = {}  # 关键词原文 -> seq 集合，包含停用的规则，供按关键词查找规则位置
+        self._keyword_of = {}  # seq -> 关键词原文
+        self._group_index = GroupIndex()
+        self._reset_matcher()
+
+    def _synced(self, expected_len: int) -> bool:
+        return not self._stale and self._source is self.plugin.data[self.data_key] and len(self._seqs) == expected_len
+
+    def ensure(self):
+        """首次使用、规则列表被整体替换或有变更未能增量应用时完整重建"""
+        if not self._synced(len(self.plugin.data[self.data_key])):
+            self.rebuild()
+
+    def _ensure_for_match(self):
+        """匹配入口使用：后台重建期间继续使用旧索引，其余情况同 ensure"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        self.ensure()
+
+    def rebuild(self):
+        self._build(self.plugin.data[self.data_key])
+        self.version += 1
+        self._after_rebuild()
+
+    def _build(self, rules: list, items: list = None):
+        """按 rules 的内容重建全部索引结构；items 为 rules 的副本时可以在后台线程中执行"""
+        self._reset()
+        self._rebuilding = True
+        try:
+            for cfg in rules if items is None else items:
+                seq = self._next_seq
+                self._next_seq += 1
+                self._seqs.append(seq)
+                self._register(seq, cfg)
+        finally:
+            self._rebuilding = False
+        self._source = rules
+        self._stale = False
+
+    def counts(self) -> tuple[int, int]:
+        """返回 (全局启用的规则数, 规则总数)"""
+        self.ensure()
+        return self._group_index.enabled_count, len(self._seqs)
+
+    def all_rules(self):
+        """返回所有规则的 Rule 对象（包含停用的），顺序不保证"""
+        self.ensure()
+        return self._group_index.rules()
+
+    def positions(self, keyword: str) -> list[int]:
+        """返回关键词原文与 keyword 完全相同的规则在列表中的位置（从 0 开始，升序）"""
+        self.ensure()
+        seqs = self._seqs
+        return sorted(bisect_left(seqs, seq) for seq in self._by_keyword.get(keyword, ()))
+
+    def position_of(self, cfg: dict):
+        """返回规则对象 cfg 当前在列表中的位置，已被删除时返回 None。
+        await（如下载图片）期间列表可能被其他操作增删，之前取得的序号会失效，恢复后用它重新定位。
+        """
+        rules = self.plugin.data[self.data_key]
+        for idx in self.positions(cfg.get("keyword", "")):
+            if rules[idx] is cfg:
+                return idx
+        return next((idx for idx, rule in enumerate(rules) if rule is cfg), None)
+
+    def apply(self, event: str, idx: int):
+        """增量应用第 idx 条规则的变更，索引与列表对不上时退回完整重建。
+        RULE_ADDED 在规则追加到列表后调用，RULE_REMOVED 在规则从列表移除后调用。
+        """
+        if event == ENTRIES_CHANGED:
+            return
+        self._changes += 1
+        if self._stale:
+            # 后台重建尚未完成，本次变更由它一并处理
+            return
+        rules = self.plugin.data[self.data_key]
+        if event == RULE_ADDED:
+            if not self._synced(len(rules) - 1) or idx != len(rules) - 1:
+                return self._fallback(event, idx)
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs.append(seq)
+            self._register(seq, rules[idx])
+        elif event == RULE_REMOVED:
+            if not self._synced(len(rules) + 1) or not 0 <= idx < len(self._seqs):
+                return self._fallback(event, idx)
+            self._unregister(self._seqs.pop(idx))
+        else:
+            if not self._synced(len(rules)) or not 0 <= idx < len(rules):
+                return self._fallback(event, idx)
+            seq = self._seqs[idx]
+            cfg = rules[idx]
+            # 只改了生效群或模式时，匹配结构保持不变；启用状态翻转时需要增删匹配结构
+            if event == GROUPS_CHANGED and self._group_index.is_enabled(seq) == bool(cfg.get("enabled", True)):
+                rule = self._make_rule(cfg)
+                old = self._rules.get(seq)
+                if old is not None:
+                    rule.pattern = old.pattern
+                    self._rules[seq] = rule
+                self._group_index.update(seq, rule)
+            else:
+                self._unregister(seq)
+                self._register(seq, cfg)
+        self.version += 1
+
+    def _fallback(self, event: str, idx: int):
+        """在后台线程中完整重建；没有事件循环时（如插件加载阶段）同步重建"""
+        self._stale = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.debug(f"{self.data_key} 索引无法增量应用 {event}({idx})，完整重建")
+            self.rebuild()
+            return
+        logger.debug(f"{self.data_key} 索引无法增量应用 {event}({idx})，转入后台完整重建")
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = loop.create_task(self._rebuild_in_background())
+
+    async def _rebuild_in_background(self):
+        while self._stale:
+            rules = self.plugin.data[self.data_key]
+            changes = self._changes
+            shadow = type(self)(self.module)
+            try:
+                await asyncio.to_thread(shadow._build, rules, list(rules))
+            except Exception as e:
+                logger.error(f"{self.data_key} 索引后台重建失败，改为同步重建: {e}")
+                self.rebuild()
+                return
+            # 期间 ensure 已同步重建过时 _stale 已清除；规则又有变化时按最新列表重新构建
+            if self._stale and changes == self._changes and rules is self.plugin.data[self.data_key]:
+                self._adopt(shadow)
+                self.version += 1
+                self._after_rebuild()
+
+    def _adopt(self, shadow: "RuleIndex"):
+        """换用后台构建好的索引结构，版本号等跨重建保留的状态不变"""
+        version = self.version
+        generation = getattr(self, "_generation", 0)
+        task = self._rebuild_task
+        changes = self._changes
+        self.__dict__.update(vars(shadow))
+        self.version = version
+        self._generation = generation + 1
+        self._rebuild_task = task
+        self._changes = changes
+
+    def _make_rule(self, cfg: dict) -> Rule:
+        return Rule(cfg, normalize_text(cfg["keyword"], self._nfkc))
+
+    def _register(self, seq: int, cfg: dict):
+        rule = self._make_rule(cfg)
+        self._keyword_of[seq] = rule.keyword
+        self._by_keyword.setdefault(rule.keyword, set()).add(seq)
+        self._group_index.add(seq, rule)
+        # 只为启用的规则建立匹配结构，全局禁用的规则在热路径上没有任何开销
+        if rule.enabled:
+            self._rules[seq] = rule
+            self._index_matcher(seq, rule)
+
+    def _unregister(self, seq: int):
+        keyword = self._keyword_of.pop(seq, None)
+        seqs = self._by_keyword.get(keyword)
+        if seqs is not None:
+            seqs.discard(seq)
+            if not seqs:
+                del self._by_keyword[keyword]
+        self._group_index.remove(seq)
+        if self._rules.pop(seq, None) is not None:
+            self._unindex_matcher(seq)
+
+    def _reset_matcher(self):
+        raise NotImplementedError
+
+    def _index_matcher(self, seq: int, rule: Rule):
+        raise NotImplementedError
+
+    def _unindex_matcher(self, seq: int):
+        raise NotImplementedError
+
+    def _after_rebuild(self):
+        pass
+
+
+class CommandIndex(RuleIndex):
+    """关键词索引：非正则关键词通过字典 O(1) 分发，正则关键词逐条 fullmatch"""
+
+    def _reset_matcher(self):
+        self._case_sensitive = self.plugin.config.get("case_sensitive", False)
+        self._nfkc = self.plugin.config.get("nfkc_normalize", False)
+        self._exact = {}            # 规范化后的关键词 -> 有序 seq 列表
+        self._rule_keys = {}        # seq -> 规范化后的关键词
+        self._regex_patterns = {}   # seq -> 编译后的正则
+        self._regex_fullmatch = {}  # seq -> 预绑定的 fullmatch
+        self._regex_seqs = set()
+
+    def _index_matcher(self, seq: int, rule: Rule):
+        if rule.regex:
+            pattern = self.plugin.regex_cache.get(rule.keyword, self.module._regex_flags())
+            if pattern is not None:
+                rule.pattern = pattern
+                self._regex_patterns[seq] = pattern
+                self._regex_fullmatch[seq] = pattern.fullmatch
+                self._regex_seqs.add(seq)
+            return
+        key = rule.normalized
+        if not self._case_sensitive:
+            key = key.lower()
+        insort(self._exact.setdefault(key, []), seq)
+        self._rule_keys[seq] = key
+
+    def _unindex_matcher(self, seq: int):
+        if self._regex_fullmatch.pop(seq, None) is not None:
+            del self._regex_patterns[seq]
+            self._regex_seqs.discard(seq)
+        key = self._rule_keys.pop(seq, None)
+        if key is not None:
+            seqs = self._exact[key]
+            seqs.remove(seq)
+            if not seqs:
+                del self._exact[key]
+
+    def _candidates(self, text: MessageText, group_id) -> tuple[list, list]:
+        """返回在当前群生效的 (命中的非正则关键词, 待执行的正则关键词)，均按列表顺序"""
+        self._ensure_for_match()
+        key = text.first_token if self._case_sensitive else text.first_token_lowered
+        exact = self._exact.get(key, ())
+        if exact:
+            exact = sorted(self._group_index.filter(set(exact), group_id))
+        regex_seqs = sorted(self._group_index.filter(self._regex_seqs, group_id))
+        return exact, regex_seqs
+
+    def iter_matches(self, text: MessageText, group_id=None):
+        """按列表顺序依次产出在当前群生效且命中的 (规则, 正则匹配结果)"""
+        exact, regex_seqs = self._candidates(text, group_id)
+        potential_cmd = text.first_token
+        regex_fullmatch = self._regex_fullmatch
+        rules = self._rules
+        for seq in merge(exact, regex_seqs):
+            fullmatch = regex_fullmatch.get(seq)
+            if fullmatch is None:
+                yield rules[seq], None
+                continue
+            match = fullmatch(potential_cmd)
+            if match:
+                yield rules[seq], match
+
+    async def first_match(self, text: MessageText, group_id, pool):
+        """与 iter_matches 的首个结果相同，但正则在进程池中限时执行"""
+        exact, regex_seqs = self._candidates(text, group_id)
+        rules = self._rules
+        if exact:
+            # 排在首个命中的非正则关键词之后的正则不可能被选中
+            regex_seqs = [seq for seq in regex_seqs if seq < exact[0]]
+        if regex_seqs:
+            candidates = [rules[seq] for seq in regex_seqs]
+            patterns = [rule.pattern for rule in candidates]
+            results = await pool.run("fullmatch", patterns, text.first_token, stop_at_first=True)
+            for rule, match in zip(candidates, results):
+                if match:
+                    return rule, match
+        if exact:
+            return rules[exact[0]], None
+        return None
+
+
+class DetectIndex(RuleIndex):
+    """检测词索引。
+
+    非正则检测词与正则的必需字面量放入 Aho-Corasick 自动机，一次扫描得到候选。
+    新增字面量先进入待合并区逐条检查，由后台线程重建自动机后并入；
+    删除字面量只需从登记表移除，自动机里残留的旧条目在查询时忽略。
+    """
+
+    def _reset_matcher(self):
+        self._default_cs = self.plugin.config.get("case_sensitive", False)
+        self._nfkc = self.plugin.config.get("nfkc_normalize", False)
+        self._ac_sensitive = AhoCorasick()
+        self._ac_insensitive = AhoCorasick()
+        self._literals = {}      # token -> (seq, 字面量, 是否忽略大小写)
+        self._rule_tokens = {}   # seq -> token
+        self._pending = {}       # 尚未并入自动机的 token -> (字面量, 是否忽略大小写)
+        self._next_token = 0
+        self._always = set()     # 没有可用字面量、每条消息都要检查的规则
+        # 否定预筛：每个字面量取一个特征字符，消息不含任何特征字符时必然没有字面量命中
+        self._signature = ({}, {})  # (区分大小写, 忽略大小写)：特征字符 -> 引用计数
+        self._rule_signature = {}   # seq -> (特征字符, 是否忽略大小写)
+        self._signature_search = None  # 特征字符编译成的字符类 search，特征字符变化后置空、用时重建
+        self._regex_patterns = {}  # seq -> 编译后的正则
+        self._regex_search = {}    # seq -> 预绑定的 search
+        self._generation = getattr(self, "_generation", 0) + 1
+        # (规范化文本, 群号, 索引版本) -> 命中的 seq，只缓存匹配结果，冷却与随机回复仍逐条消息执行
+        self._memo = LRUCache(self.plugin.config.get("match_memo_size", 1024))
+        self._memo_version = None
+
+    def _index_matcher(self, seq: int, rule: Rule):
+        if rule.regex:
+            # 预先绑定编译后的 search 方法，热路径上每条正则只剩一次 C 调用
+            flags = self.module._regex_flags(rule.cfg)
+            pattern = self.plugin.regex_cache.get(rule.keyword, flags)
+            if pattern is None:
+                return
+            rule.pattern = pattern
+            self._regex_patterns[seq] = pattern
+            self._regex_search[seq] = pattern.search
+            # 正则中必然出现的字面量一并放入自动机，消息不含该字面量时无需执行正则
+            literal = required_literal(rule.keyword, flags)
+            ignore_case = bool(pattern.flags & re.IGNORECASE)
+        else:
+            literal = rule.normalized
+            ignore_case = not rule.cfg.get("case_sensitive", self._default_cs)
+            if ignore_case:
+                literal = literal.lower()
+
+        if not literal:
+            self._always.add(seq)
+            return
+        # 取码位最大的字符作为特征字符，中文字符通常比空格、ASCII 标点少见得多
+        char = max(literal)
+        table = self._signature[ignore_case]
+        if char not in table:
+            self._signature_search = None
+        table[char] = table.get(char, 0) + 1
+        self._rule_signature[seq] = (char, ignore_case)
+        token = self._next_token
+        self._next_token += 1
+        self._literals[token] = (seq, literal, ignore_case)
+        self._rule_tokens[seq] = token
+        self._pending[token] = (literal, ignore_case)
+        # 完整重建时由 _after_rebuild 统一合并一次，否则在没有事件循环的加载阶段每条规则都会同步重建自动机
+        if not self._rebuilding:
+            self._schedule_compact()
+
+    def _unindex_matcher(self, seq: int):
+        self._regex_patterns.pop(seq, None)
+        self._regex_search.pop(seq, None)
+        self._always.discard(seq)
+        signature = self._rule_signature.pop(seq, None)
+        if signature is not None:
+            char, ignore_case = signature
+            table = self._signature[ignore_case]
+            table[char] -= 1
+            if not table[char]:
+                del table[char]
+                self._signature_search = None
+        token = self._rule_tokens.pop(seq, None)
+        if token is not None:
+            del self._literals[token]
+            self._pending.pop(token, None)
+
+    def _after_rebuild(self):
+        self._schedule_compact()
+
+    def _schedule_compact(self):
+        """有待合并的字面量时重建自动机：事件循环内放到线程执行，否则（如插件加载时）同步执行"""
+        if not self._pending:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            snapshot = self._snapshot_literals()
+            self._install_automata(snapshot, _build_automata(snapshot))
+            return
+        task = getattr(self, "_compact_task", None)
+        if task is not None and not task.done():
+            return
+        self._compact_task = loop.create_task(self._compact())
+
+    def _snapshot_literals(self) -> dict:
+        return {token: (literal, ic) for token, (_, literal, ic) in self._literals.items()}
+
+    def _install_automata(self, snapshot: dict, automata: tuple):
+        self._ac_sensitive, self._ac_insensitive = automata
+        for token in snapshot:
+            self._pending.pop(token, None)
+
+    async def _compact(self):
+        # 先让出一次事件循环，同一批连续变更只重建一次
+        await asyncio.sleep(0)
+        generation = self._generation
+        snapshot = self._snapshot_literals()
+        try:
+            automata = await asyncio.to_thread(_build_automata, snapshot)
+        except Exception as e:
+            logger.error(f"检测词自动机后台重建失败: {e}")
+            return
+        finally:
+            self._compact_task = None
+        # 后台重建期间索引被整体重建过时，快照已过期，丢弃后由新一轮合并负责
+        if generation == self._generation:
+            self._install_automata(snapshot, automata)
+        self._schedule_compact()
+
+    def rejects(self, text: MessageText) -> bool:
+        """否定预筛：能证明没有任何检测词命中时返回 True。
+        存在提取不到字面量的规则时无法证明，预筛不生效。
+        """
+        if self._always:
+            return False
+        searches = self._signature_search
+        if searches is None:
+            # 字符类正则在 C 层扫描，比逐字符查集合快数倍
+            searches = self._signature_search = tuple(
+                re.compile(f"[{''.join(re.escape(c) for c in table)}]" if table else "(?!)").search
+                for table in self._signature
+            )
+        return searches[0](text.text) is None and searches[1](text.lowered) is None
+
+    def _candidates(self, text: MessageText, group_id) -> list:
+        """自动机一次扫描得出命中的非正则检测词，以及必需字面量已出现的正则检测词，按列表顺序返回在当前群生效的部分"""
+        self._ensure_for_match()
+        msg = text.text
+        lowered = text.lowered
+        literals = self._literals
+        hits = set(self._always)
+        for token in self._ac_sensitive.search(msg) | self._ac_insensitive.search(lowered):
+            entry = literals.get(token)
+            if entry is not None:
+                hits.add(entry[0])
+        for token, (literal, ignore_case) in self._pending.items():
+            if literal in (lowered if ignore_case else msg):
+                hits.add(literals[token][0])
+
+        return sorted(self._group_index.filter(hits, group_id))
+
+    def _memo_key(self, text: MessageText, group_id):
+        """返回匹配结果缓存的键，不缓存时返回 None。规则变更后版本号变化，旧结果整体丢弃"""
+        if not self._memo.maxsize or len(text.text) > MEMO_MAX_TEXT_LEN:
+            return None
+        if self._memo_version != self.version:
+            self._memo.clear()
+            self._memo_version = self.version
+        return text.text, group_id, self.version
+
+    def _scan(self, text: MessageText, group_id):
+        msg = text.text
+        regex_search = self._regex_search
+        for seq in self._candidates(text, group_id):
+            search = regex_search.get(seq)
+            if search is not None and not search(msg):
+                continue
+            yield seq
+
+    def iter_matches(self, text: MessageText, group_id=None):
+        """按列表顺序依次产出在当前群生效且命中的检测词，只有候选中的正则检测词才需要执行正则"""
+        self._ensure_for_match()
+        if self.rejects(text):
+            return
+        rules = self._rules
+        key = self._memo_key(text, group_id)
+        if key is None:
+            for seq in self._scan(text, group_id):
+                yield rules[seq]
+            return
+        seqs = self._memo.get(key)
+        if seqs is None:
+            seqs = tuple(self._scan(text, group_id))
+            self._memo.put(key, seqs)
+        for seq in seqs:
+            yield rules[seq]
+
+    async def collect_matches(self, text: MessageText, group_id, pool) -> list:
+        """与 iter_matches 结果相同，但正则在进程池中限时执行"""
+        self._ensure_for_match()
+        if self.rejects(text):
+            return []
+        key = self._memo_key(text, group_id)
+        if key is not None:
+            seqs = self._memo.get(key)
+            if seqs is not None:
+                return [self._rules[seq] for seq in seqs]
+        seqs = self._candidates(text, group_id)
+        regex_pos = [i for i, seq in enumerate(seqs) if seq in self._regex_patterns]
+        failures = pool.failure_count
+        if regex_pos:
+            patterns = [self._regex_patterns[seqs[i]] for i in regex_pos]
+            results = await pool.run("search", patterns, text.text)
+            missed = {i for i, match in zip(regex_pos, results) if not match}
+            seqs = [seq for i, seq in enumerate(seqs) if i not in missed]
+        # 超时视为未命中只是临时结果，不写入缓存；等待期间规则有变更时版本号已不同，同样不写入
+        if key is not None and pool.failure_count == failures and key[2] == self.version:
+            self._memo.put(key, tuple(seqs))
+        rules = self._rules
+        return [rules[seq] for seq in seqs if seq in rules]
+
+
+def _build_automata(snapshot: dict) -> tuple:
+    sensitive = AhoCorasick()
+    insensitive = AhoCorasick()
+    for token, (literal, ignore_case) in snapshot.items():
+        (insensitive if ignore_case else sensitive).add(literal, token)
+    sensitive.build()
+    insensitive.build()
+    return sensitive, insensitive
+
+
+class RuleIndexManager:
+    """关键词与检测词索引的统一入口，所有修改规则的路径都通过 notify 上报细粒度变更"""
+
+    def __init__(self, *modules):
+        self.indexes = {module.data_key: module.index for module in modules}
+        self.listeners = []  # 其他关心规则变更的组件（如变更日志），签名同 notify
+
+    def notify(self, data_key: str, event: str, idx: int):
+        self.indexes[data_key].apply(event, idx)
+        for listener in self.listeners:
+            listener(data_key, event, idx)
+
+    def rebuild_all(self):
+        for index in self.indexes.values():
+            index.rebuild()
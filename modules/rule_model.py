@@ -0,0 +1,76 @@
+import sys
+from enum import Enum
+from .cooldown import DEFAULT_SCOPES, parse_cooldown
+
+
+def intern_groups(cfg: dict) -> frozenset:
+    """把规则的群号列表原地换成驻留字符串并返回成员集合。
+    同一个群号在上千条规则中只保留一份字符串，集合判断成员为 O(1)。
+    """
+    groups = cfg.get("groups")
+    if not groups:
+        return frozenset()
+    if isinstance(groups, list):
+        groups[:] = [sys.intern(gid) if type(gid) is str else gid for gid in groups]
+    return frozenset(groups)
+
+
+def group_memory_stats(rules) -> dict:
+    """统计规则的群号引用数、不同群号数，以及驻留后相比每处各存一份字符串节省的字节数（估算）"""
+    refs = 0
+    total = 0
+    unique = {}
+    for rule in rules:
+        for gid in rule.groups:
+            size = sys.getsizeof(gid)
+            refs += 1
+            total += size
+            unique[gid] = size
+    return {"refs": refs, "unique": len(unique), "saved_bytes": total - sum(unique.values())}
+
+
+class GroupMode(Enum):
+    """规则在群聊中的生效模式"""
+    ALL = "all"
+    WHITELIST = "whitelist"
+    BLACKLIST = "blacklist"
+
+    @classmethod
+    def parse(cls, value) -> "GroupMode":
+        # 与原有判断一致：未设置时为白名单，无法识别的模式视为在所有群生效
+        if value is None:
+            return cls.WHITELIST
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.ALL
+
+
+class Rule:
+    """规则在内存中的紧凑表示，由索引在注册规则时从 JSON 配置构建。
+
+    匹配与回复用到的字段都预先取出，热路径上不再逐条 dict.get；
+    cfg 仍是管理命令、WebUI 与持久化使用的原始配置，保存时照原样写出，文件格式保持不变。
+    回复条目每次从 cfg 读取，只改回复内容时无需重建规则对象。
+    """
+
+    __slots__ = (
+        "cfg", "keyword", "normalized", "regex", "enabled", "mode", "groups",
+        "pattern", "cooldown", "cooldown_scopes",
+    )
+
+    def __init__(self, cfg: dict, normalized: str):
+        self.cfg = cfg
+        self.keyword = cfg["keyword"]
+        self.normalized = normalized  # 规范化后的关键词原文
+        self.regex = bool(cfg.get("regex", False))
+        self.enabled = bool(cfg.get("enabled", True))
+        self.mode = GroupMode.parse(cfg.get("mode"))
+        self.groups = intern_groups(cfg)
+        self.pattern = None           # 编译后的正则，由索引在建立匹配结构时填入
+        self.cooldown = parse_cooldown(cfg.get("cooldown"), self.keyword)  # 未单独设置或无效时为 None，使用全局冷却
+        self.cooldown_scopes = tuple(cfg.get("cooldown_scopes") or DEFAULT_SCOPES)
+
+    @property
+    def entries(self) -> list:
+        return self.cfg.get("entries") or []
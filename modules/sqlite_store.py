@@ -0,0 +1,283 @@
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from astrbot.api import logger
+from .data_saver import atomic_write_json, snapshot_json
+from .lazy_entries import LazyEntries
+from .storage import RuleRepository, JournalRepository, empty_data, journal_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    regex INTEGER,
+    enabled INTEGER,
+    mode TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    has_groups INTEGER,
+    has_entries INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_rules_position ON rules (kind, position);
+CREATE INDEX IF NOT EXISTS idx_rules_keyword ON rules (kind, keyword);
+CREATE TABLE IF NOT EXISTS entries (
+    rule_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    PRIMARY KEY (rule_id, position)
+);
+CREATE TABLE IF NOT EXISTS rule_groups (
+    rule_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    group_id NOT NULL,
+    PRIMARY KEY (rule_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_rule_groups_group ON rule_groups (group_id);
+CREATE TABLE IF NOT EXISTS images (
+    rule_id INTEGER NOT NULL,
+    entry_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT,
+    url TEXT,
+    PRIMARY KEY (rule_id, entry_position, position)
+);
+CREATE INDEX IF NOT EXISTS idx_images_path ON images (path);
+"""
+
+# 单独成列的字段，其余字段原样存入 extra
+_COLUMNS = ("keyword", "regex", "enabled", "mode")
+# 存入子表的列表字段及记录其是否存在的列，读回时只补出原本就有的键；早期数据库中为 NULL，按存在处理
+_CHILD_KEYS = (("groups", "has_groups"), ("entries", "has_entries"))
+_STRUCTURED = frozenset(_COLUMNS + ("entries", "groups"))
+
+
+def sqlite_path(data_file: str) -> str:
+    return os.path.splitext(data_file)[0] + ".db"
+
+
+def _flag(value):
+    # 保留字段缺失的情况，读回时不补出原本没有的键
+    return None if value is None else int(bool(value))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # 读取在事件循环中、写入在保存线程中，两者不会同时进行
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rules)")}
+    for _, column in _CHILD_KEYS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE rules ADD COLUMN {column} INTEGER")
+    return conn
+
+
+def _read_all(conn: sqlite3.Connection) -> dict:
+    """按原有顺序读出全部规则，结构与 keywords.json 相同"""
+    entries = defaultdict(list)
+    for rule_id, data in conn.execute("SELECT rule_id, data FROM entries ORDER BY rule_id, position"):
+        entries[rule_id].append(json.loads(data))
+    groups = defaultdict(list)
+    for rule_id, group_id in conn.execute("SELECT rule_id, group_id FROM rule_groups ORDER BY rule_id, position"):
+        groups[rule_id].append(group_id)
+    data = empty_data()
+    rows = conn.execute(
+        "SELECT id, kind, keyword, regex, enabled, mode, extra, has_groups, has_entries FROM rules ORDER BY kind, position"
+    )
+    for rule_id, kind, keyword, regex, enabled, mode, extra, has_groups, has_entries in rows:
+        rule = {"keyword": keyword}
+        if regex is not None:
+            rule["regex"] = bool(regex)
+        if enabled is not None:
+            rule["enabled"] = bool(enabled)
+        if mode is not None:
+            rule["mode"] = mode
+        if has_groups is None or has_groups:
+            rule["groups"] = groups.get(rule_id, [])
+        if has_entries is None or has_entries:
+            rule["entries"] = entries.get(rule_id, [])
+        rule.update(json.loads(extra))
+        data.setdefault(kind, []).append(rule)
+    return data
+
+
+def export_to_json(data_file: str) -> bool:
+    """从 SQLite 切换回文件存储时把数据库导出为 keywords.json，并把数据库改名保留"""
+    path = sqlite_path(data_file)
+    if not os.path.exists(path) or os.path.exists(data_file):
+        return False
+    conn = _connect(path)
+    try:
+        data = _read_all(conn)
+    finally:
+        conn.close()
+    atomic_write_json(data_file, data)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.replace(path + suffix, path + suffix + ".migrated")
+    logger.info(f"已将 SQLite 中的 {sum(len(rules) for rules in data.values())} 条规则导出到 keywords.json")
+    return True
+
+
+class SqliteRepository(RuleRepository):
+    """keywords.db（SQLite，WAL 模式）存储。
+
+    规则、回复条目、群组绑定与图片各占一张表，按关键词、群号与图片路径建有索引。
+    保存时把变更记录在一个事务内逐条应用：修改只重写该规则的行与子表，新增插入一行，
+    删除后把同类规则中排在后面的位置减一，不再重写整份数据。
+    首次启动时若数据库为空，会把 keywords.json（及遗留的变更日志）一次性迁移进来。
+    """
+
+    def __init__(self, data_file: str, source):
+        super().__init__(data_file, source)
+        self.path = sqlite_path(data_file)
+        self._conn = None
+
+    def load(self) -> dict:
+        self._conn = _connect(self.path)
+        migrated = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        if migrated is None and not self._conn.execute("SELECT 1 FROM rules LIMIT 1").fetchone():
+            return self._migrate()
+        return _read_all(self._conn)
+
+    def _migrate(self) -> dict:
+        journal = JournalRepository(self.data_file, self._source, 0)
+        data = journal.load()
+        if journal.load_failed:
+            # 保留损坏的 keywords.json，下次启动时再尝试迁移
+            self.load_failed = True
+            return data
+        with self._conn:
+            self._write_all(data)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', '1')")
+        for path in (self.data_file, journal.path):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        count = sum(len(rules) for rules in data.values())
+        if count:
+            logger.info(f"已将 keywords.json 中的 {count} 条规则迁移到 SQLite")
+        return data
+
+    def take_batch(self) -> tuple:
+        """在事件循环中取出待写内容：("ops", 变更记录) 或 ("full", 完整数据)"""
+        records, full = self._take_records()
+        if full:
+            return "full", snapshot_json(self._source())
+        return "ops", records
+
+    def write_batch(self, batch: tuple):
+        """在后台线程中写入 take_batch 的结果，整批在一个事务内完成"""
+        kind, payload = batch
+        if kind == "ops" and not payload:
+            return
+        try:
+            with self._conn:
+                if kind == "full":
+                    self._write_all(payload)
+                else:
+                    for record in payload:
+                        self._apply(record)
+        except Exception:
+            # 事务已回滚，数据库停留在上一次保存的状态，下次保存时改为写入完整数据
+            self._needs_snapshot = True
+            raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _write_all(self, data: dict):
+        conn = self._conn
+        for table in ("images", "rule_groups", "entries", "rules"):
+            conn.execute(f"DELETE FROM {table}")
+        for kind, rules in data.items():
+            for position, rule in enumerate(rules):
+                self._insert_rule(kind, position, rule)
+
+    def _apply(self, record: dict):
+        kind = record["key"]
+        idx = record["idx"]
+        if record["op"] == "add":
+            self._insert_rule(kind, idx, record["rule"])
+            return
+        rule_id = self._rule_id(kind, idx)
+        self._delete_children(rule_id)
+        if record["op"] == "remove":
+            self._conn.execute("DELETE FROM rules WHERE id = ?", (rule_id,))
+            self._conn.execute(
+                "UPDATE rules SET position = position - 1 WHERE kind = ? AND position > ?", (kind, idx)
+            )
+            return
+        rule = record["rule"]
+        self._conn.execute(
+            "UPDATE rules SET keyword = ?, regex = ?, enabled = ?, mode = ?, extra = ?, has_groups = ?, has_entries = ?"
+            " WHERE id = ?",
+            self._row(rule) + (rule_id,),
+        )
+        self._insert_children(rule_id, rule)
+
+    def _rule_id(self, kind: str, position: int) -> int:
+        row = self._conn.execute(
+            "SELECT id FROM rules WHERE kind = ? AND position = ?", (kind, position)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"数据库中找不到 {kind} 第 {position} 条规则")
+        return row[0]
+
+    @staticmethod
+    def _row(rule: dict) -> tuple:
+        extra = {key: value for key, value in rule.items() if key not in _STRUCTURED}
+        return (
+            rule.get("keyword", ""),
+            _flag(rule.get("regex")),
+            _flag(rule.get("enabled")),
+            rule.get("mode"),
+            json.dumps(extra, ensure_ascii=False),
+        ) + tuple(int(key in rule) for key, _ in _CHILD_KEYS)
+
+    def _insert_rule(self, kind: str, position: int, rule: dict):
+        cursor = self._conn.execute(
+            "INSERT INTO rules (kind, position, keyword, regex, enabled, mode, extra, has_groups, has_entries)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, position) + self._row(rule),
+        )
+        self._insert_children(cursor.lastrowid, rule)
+
+    def _insert_children(self, rule_id: int, rule: dict):
+        conn = self._conn
+        entries = rule.get("entries") or []
+        if isinstance(entries, LazyEntries):
+            entries = entries.to_list()
+        conn.executemany(
+            "INSERT INTO entries (rule_id, position, text, data) VALUES (?, ?, ?, ?)",
+            [
+                (rule_id, i, entry.get("text", "") if isinstance(entry, dict) else str(entry),
+                 json.dumps(entry, ensure_ascii=False))
+                for i, entry in enumerate(entries)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO images (rule_id, entry_position, position, path, url) VALUES (?, ?, ?, ?, ?)",
+            [
+                (rule_id, i, j, image.get("path"), image.get("url"))
+                for i, entry in enumerate(entries) if isinstance(entry, dict)
+                for j, image in enumerate(entry.get("images") or []) if isinstance(image, dict)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO rule_groups (rule_id, position, group_id) VALUES (?, ?, ?)",
+            [(rule_id, i, group_id) for i, group_id in enumerate(rule.get("groups") or [])],
+        )
+
+    def _delete_children(self, rule_id: int):
+        for table in ("images", "rule_groups", "entries"):
+            self._conn.execute(f"DELETE FROM {table} WHERE rule_id = ?", (rule_id,))
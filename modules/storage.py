@@ -0,0 +1,215 @@
+import json
+import os
+from astrbot.api import logger
+from .data_saver import atomic_write_json, snapshot_json
+from .lazy_entries import json_default
+from .rule_index import RULE_ADDED, RULE_REMOVED
+
+# 快照中记录已并入的最后一条日志序号，压缩中途崩溃时据此跳过重复的日志
+JOURNAL_SEQ_KEY = "_journal_seq"
+
+
+def empty_data() -> dict:
+    return {"command_triggered": [], "auto_detect": []}
+
+
+def journal_path(data_file: str) -> str:
+    return os.path.splitext(data_file)[0] + ".journal.jsonl"
+
+
+def _apply_record(data: dict, record: dict):
+    """把一条变更记录应用到数据上，与记录时的列表状态对不上时抛出 ValueError"""
+    rules = data.setdefault(record["key"], [])
+    op = record["op"]
+    idx = record["idx"]
+    if op == "add":
+        if idx != len(rules):
+            raise ValueError(f"新增位置 {idx} 与列表长度 {len(rules)} 不符")
+        rules.append(record["rule"])
+    elif op == "remove":
+        if not 0 <= idx < len(rules):
+            raise ValueError(f"删除位置 {idx} 超出范围")
+        rules.pop(idx)
+    elif op == "set":
+        if not 0 <= idx < len(rules):
+            raise ValueError(f"修改位置 {idx} 超出范围")
+        rules[idx] = record["rule"]
+    else:
+        raise ValueError(f"未知操作 {op}")
+
+
+class RuleRepository:
+    """规则数据的持久化接口，具体存储方式由配置 storage_mode 选择。
+
+    插件始终在内存中维护 data，两个模块与 WebUI 修改规则后通过 RuleIndexManager 上报变更，
+    仓库作为监听器把变更整理成记录（新增/修改带整条规则副本，删除只带位置）。
+    保存时 DebouncedSaver 在事件循环中调用 take_batch 取出待写内容，再在后台线程调用 write_batch 写入。
+    """
+
+    def __init__(self, data_file: str, source):
+        self.data_file = data_file
+        self._source = source          # 返回当前数据的函数
+        self.seq = 0                   # 最后一条记录的序号
+        self.load_failed = False       # 读取已有数据失败，此时不应覆盖或迁移原数据
+        self._pending = []             # 尚未写入的记录
+        self._since_save = 0           # 上次请求保存后产生的记录数
+        self._needs_snapshot = False   # 有未经过记录的修改，下次保存需写入完整数据
+
+    def load(self) -> dict:
+        raise NotImplementedError
+
+    def record(self, data_key: str, event: str, idx: int):
+        """RuleIndexManager 的监听器，在修改发生后立即复制受影响的规则"""
+        self.seq += 1
+        self._since_save += 1
+        record = {"n": self.seq, "key": data_key, "idx": idx}
+        if event == RULE_REMOVED:
+            record["op"] = "remove"
+        else:
+            record["op"] = "add" if event == RULE_ADDED else "set"
+            record["rule"] = snapshot_json(self._source()[data_key][idx])
+        self._pending.append(record)
+
+    def note_save(self):
+        """每次请求保存时调用；期间没有任何变更记录说明修改绕过了 notify，改为写入完整数据"""
+        if not self._since_save:
+            self._needs_snapshot = True
+        self._since_save = 0
+
+    def _take_records(self) -> tuple[list, bool]:
+        """取出待写记录，返回 (记录列表, 是否需要写入完整数据)"""
+        records, self._pending = self._pending, []
+        full, self._needs_snapshot = self._needs_snapshot, False
+        return records, full
+
+    def take_batch(self):
+        raise NotImplementedError
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _read_json(self) -> dict:
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"加载关键词数据失败: {e}")
+                self.load_failed = True
+        return empty_data()
+
+
+class JournalRepository(RuleRepository):
+    """keywords.json 快照加旁边的追加式变更日志。
+
+    保存时只把新记录追加到日志；日志超过 compact_bytes 后，在后台线程把当前数据写成新快照并清空日志。
+    """
+
+    def __init__(self, data_file: str, source, compact_bytes: int):
+        super().__init__(data_file, source)
+        self.path = journal_path(data_file)
+        self.compact_bytes = compact_bytes
+        self.size = 0                  # 日志文件当前大小（字节）
+        self.compactions = 0
+
+    def load(self) -> dict:
+        """读取快照并重放其后的日志"""
+        data = self._read_json()
+        self.seq = data.pop(JOURNAL_SEQ_KEY, 0)
+        if not os.path.exists(self.path):
+            return data
+        replayed = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                self.size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 只可能是崩溃时写了一半的最后一行
+                    logger.warning("变更日志末尾存在不完整的记录，已忽略")
+                    self._needs_snapshot = True
+                    break
+                if record["n"] <= self.seq:
+                    continue
+                try:
+                    _apply_record(data, record)
+                except (KeyError, ValueError) as e:
+                    logger.error(f"重放变更日志失败 (序号 {record.get('n')}): {e}，之后的记录已忽略")
+                    self._needs_snapshot = True
+                    break
+                self.seq = record["n"]
+                replayed += 1
+        if replayed:
+            logger.info(f"已从变更日志重放 {replayed} 条记录")
+        if self._needs_snapshot and not self.load_failed:
+            # 日志尾部已损坏，立即写成快照，避免之后追加的记录排在损坏的行后面
+            self._needs_snapshot = False
+            self.write_batch(("compact", {**data, JOURNAL_SEQ_KEY: self.seq}))
+            self.size = 0
+        return data
+
+    def take_batch(self) -> tuple:
+        """在事件循环中取出待写内容：("append", 日志文本) 或 ("compact", 完整快照)"""
+        records, full = self._take_records()
+        payload = "".join(json.dumps(r, ensure_ascii=False, default=json_default) + "\n" for r in records)
+        if full or self.size + len(payload.encode('utf-8')) > self.compact_bytes:
+            self.size = 0
+            self.compactions += 1
+            snapshot = snapshot_json(self._source())
+            snapshot[JOURNAL_SEQ_KEY] = self.seq
+            return "compact", snapshot
+        self.size += len(payload.encode('utf-8'))
+        return "append", payload
+
+    def write_batch(self, batch: tuple):
+        """在后台线程中写入 take_batch 的结果"""
+        kind, payload = batch
+        if kind == "append":
+            if not payload:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            return
+        # 先原子替换快照，再清空日志；两步之间崩溃时，日志中的记录序号都不大于快照序号，重放时会被跳过
+        atomic_write_json(self.data_file, payload)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            os.fsync(f.fileno())
+
+
+class JsonRepository(RuleRepository):
+    """整文件存储：每次保存把完整数据原子写入 keywords.json"""
+
+    def load(self) -> dict:
+        # 从日志模式切换过来时先重放遗留的日志，再写回完整快照并删除日志
+        journal = JournalRepository(self.data_file, self._source, 0)
+        data = journal.load()
+        self.load_failed = journal.load_failed
+        if os.path.exists(journal.path) and not self.load_failed:
+            try:
+                atomic_write_json(self.data_file, data)
+                os.remove(journal.path)
+            except Exception as e:
+                logger.error(f"合并变更日志失败: {e}")
+        return data
+
+    def streamable(self) -> bool:
+        """数据只在 keywords.json 中、没有遗留的变更日志时，可以交给流式加载逐条解析"""
+        return os.path.exists(self.data_file) and not os.path.exists(journal_path(self.data_file))
+
+    def record(self, data_key: str, event: str, idx: int):
+        # 每次都写完整数据，无需逐条记录
+        pass
+
+    def note_save(self):
+        pass
+
+    def take_batch(self):
+        return snapshot_json(self._source())
+
+    def write_batch(self, batch):
+        atomic_write_json(self.data_file, batch)
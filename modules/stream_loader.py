@@ -0,0 +1,207 @@
+import asyncio
+import codecs
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# 顶层字段的类型：规则列表中的一条规则，或其他整体解析的字段
+ITEM = "item"
+FIELD = "field"
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkReader:
+    """按块读取并解码 UTF-8 文件，内存中只保留尚未解析的尾部"""
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self._f = f
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.chunk_size = chunk_size
+        self.text = ""        # 尚未丢弃的文本
+        self.pos = 0          # 当前解析位置（相对 text）
+        self.eof = False
+        self.bytes_read = 0
+
+    def fill(self) -> bool:
+        """丢弃已解析的部分并读入下一块，已到文件末尾时返回 False。
+        未解析的部分越长每次读得越多，超过块大小的对象不会被反复从头解析。
+        """
+        if self.eof:
+            return False
+        if self.pos:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        data = self._f.read(max(self.chunk_size, len(self.text)))
+        self.bytes_read += len(data)
+        if not data:
+            self.eof = True
+            self.text += self._decoder.decode(b"", final=True)
+            return False
+        self.text += self._decoder.decode(data)
+        return True
+
+
+def _skip(reader: ChunkReader):
+    while True:
+        reader.pos = _WHITESPACE.match(reader.text, reader.pos).end()
+        if reader.pos < len(reader.text) or not reader.fill():
+            return
+
+
+def _startswith(reader: ChunkReader, token: str) -> bool:
+    _skip(reader)
+    return reader.text.startswith(token, reader.pos)
+
+
+def _decode(reader: ChunkReader, decode):
+    _skip(reader)
+    while True:
+        try:
+            value, end = decode(reader.text, reader.pos)
+        except json.JSONDecodeError:
+            # 值被块边界截断，读入更多内容后重试；已到文件末尾说明格式错误
+            if reader.fill():
+                continue
+            raise
+        # 数字等值紧贴缓冲区末尾时可能被截断，确认后面还有内容或已到文件末尾
+        if end < len(reader.text) or not reader.fill():
+            reader.pos = end
+            return value
+
+
+def iter_top_level(reader: ChunkReader):
+    """逐条解析 keywords.json 的顶层对象，产出 (类型, 字段名, 值)。
+    列表字段先产出一个空列表，再逐个产出其中的元素；其余字段整体产出。格式错误时抛出 ValueError。
+    """
+    decode = json.JSONDecoder().raw_decode
+    if not _startswith(reader, "{"):
+        raise ValueError("顶层不是 JSON 对象")
+    reader.pos += 1
+    if _startswith(reader, "}"):
+        return
+    while True:
+        key = _decode(reader, decode)
+        if not _startswith(reader, ":"):
+            raise ValueError(f"字段 {key} 后缺少冒号")
+        reader.pos += 1
+        if _startswith(reader, "["):
+            yield FIELD, key, []
+            reader.pos += 1
+            if _startswith(reader, "]"):
+                reader.pos += 1
+            else:
+                while True:
+                    yield ITEM, key, _decode(reader, decode)
+                    if _startswith(reader, ","):
+                        reader.pos += 1
+                    elif _startswith(reader, "]"):
+                        reader.pos += 1
+                        break
+                    else:
+                        raise ValueError(f"字段 {key} 的列表中缺少逗号或右方括号")
+        else:
+            yield FIELD, key, _decode(reader, decode)
+        if _startswith(reader, ","):
+            reader.pos += 1
+        elif _startswith(reader, "}"):
+            return
+        else:
+            raise ValueError(f"字段 {key} 后缺少逗号或右花括号")
+
+
+class StreamingLoader:
+    """在后台线程中按块读取并逐条解析 keywords.json，每解析 batch_size 条规则交给事件循环发布一次。
+
+    publish(batch) 与 finish(error) 都在事件循环中调用，规则列表与匹配索引只在事件循环中修改；
+    每发布一批让出一次事件循环，期间照常处理消息，已发布的规则立即可以匹配。
+    """
+
+    def __init__(self, path: str, publish, finish, batch_size: int = 100):
+        self.path = path
+        self._publish = publish
+        self._finish = finish
+        self.batch_size = batch_size
+        self.loaded = 0        # 已发布的规则数
+        self.position = 0      # 已读取的字节数
+        self.total = 0         # 文件总字节数
+        self.done = False
+        self.elapsed = 0.0
+        self._loop = None
+        self._started = 0.0
+        self._cancelled = False
+        self._batches = deque()      # 已解析、尚未发布的批次，只在事件循环中访问
+        self._wakeup = None
+        self._parsed = False
+        self._error = None
+        self._task = None
+
+    @property
+    def percent(self) -> int:
+        return int(self.position * 100 / self.total) if self.total else 0
+
+    def start(self, loop):
+        self._loop = loop
+        self._started = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._drain())
+        threading.Thread(target=self._run, name="keywords-load", daemon=True).start()
+
+    def cancel(self):
+        self._cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+
+    def _run(self):
+        error = None
+        try:
+            with open(self.path, "rb") as f:
+                self.total = os.fstat(f.fileno()).st_size
+                reader = ChunkReader(f)
+                batch = []
+                for kind, key, value in iter_top_level(reader):
+                    if self._cancelled:
+                        return
+                    batch.append((kind, key, value))
+                    self.position = reader.bytes_read
+                    if len(batch) >= self.batch_size:
+                        self._post(batch)
+                        batch = []
+                self._post(batch)
+        except Exception as e:
+            error = e
+        self._post(None, error)
+
+    def _post(self, batch, error=None):
+        """从解析线程把一批数据（None 表示解析结束）交给事件循环"""
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, batch, error)
+        except RuntimeError:
+            # 事件循环已关闭（插件在加载途中被卸载）
+            self._cancelled = True
+
+    def _enqueue(self, batch, error):
+        if batch is None:
+            self._parsed = True
+            self._error = error
+        else:
+            self._batches.append(batch)
+        self._wakeup.set()
+
+    async def _drain(self):
+        batches = self._batches
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while batches:
+                self.loaded += self._publish(batches.popleft())
+                await asyncio.sleep(0)
+            if self._parsed:
+                break
+        self.done = True
+        self.elapsed = time.monotonic() - self._started
+        self._finish(self._error)
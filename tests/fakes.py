@@ -0,0 +1,88 @@
+"""测试用的最小插件：使用真实的模块、索引与存储，只替换 AstrBot 相关的部分"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from astrbot.api.message_components import Plain  # noqa: E402
+
+from modules.auto_detect import AutoDetectModule  # noqa: E402
+from modules.command_triggered import CommandTriggeredModule  # noqa: E402
+from modules.matcher import RegexCache  # noqa: E402
+from modules.rule_index import RuleIndexManager  # noqa: E402
+
+
+class FakeEvent:
+    def __init__(self, message: str, group_id: str = "100"):
+        self.message_str = message
+        self._group_id = group_id
+
+    def get_messages(self):
+        return [Plain(self.message_str)]
+
+    def get_group_id(self):
+        return self._group_id
+
+    def get_sender_id(self):
+        return "admin"
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def plain_result(self, text: str):
+        return text
+
+
+class FakePlugin:
+    """按 main.KeywordsReplyPlugin 的方式组装模块、索引与存储。
+    image_hook 为处理回复图片时调用的协程，用来模拟下载图片期间插入的其他操作。
+    """
+
+    def __init__(self, repository=None, data=None, config=None):
+        self.config = config or {}
+        self.repository = repository
+        self.data = repository.load() if repository is not None else (data or {"command_triggered": [], "auto_detect": []})
+        self.regex_cache = RegexCache()
+        self.regex_pool = None
+        self.image_hook = None
+        self.saves = 0
+        self.cmd_module = CommandTriggeredModule(self)
+        self.detect_module = AutoDetectModule(self)
+        self.index_manager = RuleIndexManager(self.cmd_module, self.detect_module)
+        self.index_manager.rebuild_all()
+        if repository is not None:
+            self.index_manager.listeners.append(repository.record)
+
+    def flush(self):
+        """同步写入待保存的内容，代替 DebouncedSaver"""
+        self.repository.write_batch(self.repository.take_batch())
+
+    def _is_admin(self, event):
+        return True
+
+    def _regex_risk(self, pattern, flags=0):
+        return ""
+
+    def _regex_warning(self, pattern, flags=0):
+        return ""
+
+    def _save_data(self):
+        self.saves += 1
+        if self.repository is not None:
+            self.repository.note_save()
+
+    def _parse_message_to_entry(self, components):
+        text = "".join(comp.text for comp in components if isinstance(comp, Plain)).strip()
+        return {"text": text, "images": []}, False
+
+    async def _process_entry_images(self, entry):
+        if self.image_hook is not None:
+            hook, self.image_hook = self.image_hook, None
+            await hook()
+        await asyncio.sleep(0)
+        return entry
+
+
+async def run_command(handler, message: str) -> list:
+    return [result async for result in handler(FakeEvent(message))]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("astrbot")
+
+from fakes import FakePlugin, run_command  # noqa: E402
+from modules.sqlite_store import SqliteRepository  # noqa: E402
+from modules.storage import JournalRepository  # noqa: E402
+
+
+def _rule(keyword, reply):
+    return {"keyword": keyword, "entries": [{"text": reply, "images": []}],
+            "regex": False, "enabled": True, "mode": "whitelist", "groups": ["100"]}
+
+
+def _journal(path):
+    return JournalRepository(str(path / "keywords.json"), lambda: None, 1 << 20)
+
+
+def _sqlite(path):
+    return SqliteRepository(str(path / "keywords.json"), lambda: None)
+
+
+REPOSITORIES = [_journal, _sqlite]
+
+
+def _make(tmp_path, factory):
+    seed = FakePlugin(factory(tmp_path))
+    seed.repository._source = lambda: seed.data
+    for kind in ("command_triggered", "auto_detect"):
+        seed.data[kind].extend(_rule(k, f"{k}回复") for k in ("甲", "乙", "丙"))
+    seed.repository.note_save()
+    seed.repository._needs_snapshot = True
+    seed.flush()
+    seed.repository.close()
+    plugin = FakePlugin(factory(tmp_path))
+    plugin.repository._source = lambda: plugin.data
+    return plugin
+
+
+def _reload(tmp_path, factory, plugin):
+    plugin.flush()
+    plugin.repository.close()
+    repository = factory(tmp_path)
+    try:
+        return repository.load()
+    finally:
+        repository.close()
+
+
+def _delete_first(plugin, module):
+    async def hook():
+        await run_command(module.del_items, "/删除 1")
+    plugin.image_hook = hook
+
+
+@pytest.mark.parametrize("factory", REPOSITORIES)
+@pytest.mark.parametrize("data_key", ["command_triggered", "auto_detect"])
+def test_add_reply_survives_concurrent_delete(tmp_path, factory, data_key):
+    plugin = _make(tmp_path, factory)
+    module = plugin.cmd_module if data_key == "command_triggered" else plugin.detect_module
+    _delete_first(plugin, module)
+    asyncio.run(run_command(module.add_reply, "/添加回复 3 新回复"))
+
+    rules = plugin.data[data_key]
+    assert [r["keyword"] for r in rules] == ["乙", "丙"]
+    assert [e["text"] for e in rules[1]["entries"]] == ["丙回复", "新回复"]
+    assert [e["text"] for e in rules[0]["entries"]] == ["乙回复"]
+    assert module.index.positions("丙") == [1]
+    assert _reload(tmp_path, factory, plugin) == plugin.data
+
+
+@pytest.mark.parametrize("factory", REPOSITORIES)
+@pytest.mark.parametrize("data_key", ["command_triggered", "auto_detect"])
+def test_add_item_to_existing_rule_survives_concurrent_delete(tmp_path, factory, data_key):
+    plugin = _make(tmp_path, factory)
+    module = plugin.cmd_module if data_key == "command_triggered" else plugin.detect_module
+    _delete_first(plugin, module)
+    asyncio.run(run_command(module.add_item, "/添加 丙 又一条"))
+
+    rules = plugin.data[data_key]
+    assert [r["keyword"] for r in rules] == ["乙", "丙"]
+    assert [e["text"] for e in rules[1]["entries"]] == ["丙回复", "又一条"]
+    assert _reload(tmp_path, factory, plugin) == plugin.data
+
+
+@pytest.mark.parametrize("factory", REPOSITORIES)
+@pytest.mark.parametrize("data_key", ["command_triggered", "auto_detect"])
+def test_edit_reply_survives_concurrent_delete(tmp_path, factory, data_key):
+    plugin = _make(tmp_path, factory)
+    module = plugin.cmd_module if data_key == "command_triggered" else plugin.detect_module
+    _delete_first(plugin, module)
+    asyncio.run(run_command(module.edit_reply, "/编辑回复 3 1 改过"))
+
+    rules = plugin.data[data_key]
+    assert [[e["text"] for e in r["entries"]] for r in rules] == [["乙回复"], ["改过"]]
+    assert _reload(tmp_path, factory, plugin) == plugin.data
+
+
+@pytest.mark.parametrize("factory", REPOSITORIES)
+@pytest.mark.parametrize("data_key", ["command_triggered", "auto_detect"])
+def test_add_reply_to_rule_deleted_meanwhile(tmp_path, factory, data_key):
+    plugin = _make(tmp_path, factory)
+    module = plugin.cmd_module if data_key == "command_triggered" else plugin.detect_module
+
+    async def hook():
+        await run_command(module.del_items, "/删除 3")
+    plugin.image_hook = hook
+    replies = asyncio.run(run_command(module.add_reply, "/添加回复 3 新回复"))
+
+    assert "已被删除" in replies[-1]
+    assert [r["keyword"] for r in plugin.data[data_key]] == ["甲", "乙"]
+    assert _reload(tmp_path, factory, plugin) == plugin.data
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("astrbot")
+
+from fakes import FakePlugin  # noqa: E402
+from modules.cooldown import CooldownStore, cooldown_keys  # noqa: E402
+from modules.matcher import MessageText  # noqa: E402
+
+
+def test_long_cooldown_does_not_silence_shorter_rules_in_session():
+    store = CooldownStore(clock=lambda: 0)
+    keys = cooldown_keys(("session",), "100", "u1", 1)
+    # 冷却 600 秒的规则触发后，同一会话内冷却 5 秒的规则只需等待自己的 5 秒
+    store.start(keys[0], 600, now=0)
+    assert store.remaining_any(keys, 5, now=3) == 2
+    assert store.remaining_any(keys, 5, now=6) == 0
+    assert store.remaining_any(keys, 600, now=6) == 594
+    assert store.hits == 2
+
+
+def test_short_cooldown_still_blocks_longer_rules_for_their_own_duration():
+    store = CooldownStore(clock=lambda: 0)
+    key = ("session", "100")
+    store.start(key, 5, now=0)
+    store.remaining(key, 600, now=1)
+    # 记录按见过的最长冷却保留，其他会话的写入不会提前清理它
+    store.start(("session", "200"), 5, now=100)
+    assert store.remaining(key, 600, now=100) == 500
+    store.start(("session", "200"), 5, now=650)
+    assert store.stats()["active"] == 1
+    assert store.expired == 1
+
+
+def test_rules_with_same_keyword_keep_separate_cooldowns():
+    plugin = FakePlugin(data={"command_triggered": [], "auto_detect": [
+        {"keyword": "你好", "entries": [{"text": "甲", "images": []}], "regex": False, "enabled": True,
+         "mode": "whitelist", "groups": ["100"], "cooldown_scopes": ["session_rule"]},
+        {"keyword": "你好", "entries": [{"text": "乙", "images": []}], "regex": False, "enabled": True,
+         "mode": "whitelist", "groups": ["100"], "cooldown_scopes": ["session_rule"]},
+    ]})
+    first, second = plugin.detect_module.index.iter_matches(MessageText("你好"), "100")
+    store = plugin.detect_module.cooldowns
+    for key in cooldown_keys(first.cooldown_scopes, "100", "u1", id(first.cfg)):
+        store.start(key, 60, now=0)
+    second_keys = cooldown_keys(second.cooldown_scopes, "100", "u1", id(second.cfg))
+    assert store.remaining_any(second_keys, 60, now=1) == 0
@@ -0,0 +1,34 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+pytest.importorskip("astrbot")
+
+import fakes  # noqa: E402,F401  把仓库根目录加入 sys.path
+from modules.data_saver import atomic_write_json  # noqa: E402
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="Windows 不支持完整的文件权限位")
+
+
+@posix_only
+def test_atomic_write_keeps_existing_file_mode(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text("{}", encoding="utf-8")
+    os.chmod(path, 0o640)
+    atomic_write_json(str(path), {"auto_detect": []})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert json.loads(path.read_text(encoding="utf-8")) == {"auto_detect": []}
+
+
+@posix_only
+def test_atomic_write_creates_new_file_like_open(tmp_path):
+    path = tmp_path / "keywords.json"
+    atomic_write_json(str(path), [])
+    reference = tmp_path / "reference.json"
+    with open(reference, "w"):
+        pass
+    assert stat.S_IMODE(os.stat(path).st_mode) == stat.S_IMODE(os.stat(reference).st_mode)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
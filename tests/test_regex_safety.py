@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("astrbot")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.regex_safety import analyze_regex  # noqa: E402
+
+# 指数级回溯：必须拒绝
+UNSAFE = [
+    r"(a|b|ab)*c",
+    r"^(a?){25}a{25}$",
+    r"(.*a){12}",
+    r"(a|aa)*",
+    r"(a|a)*",
+    r"(a+)+$",
+    r"(\s*\w+)*",
+    r"(x\w+)+",
+    r"(\d+|[a-z]+)*!",
+]
+
+# 常见写法：既不拒绝也不提示
+SAFE = [
+    r"(a|ab)*c",
+    r"(\w|\d)+$",
+    r"(\d{1,3}\.){3}\d{1,3}",
+    r"(x(?:ab|cd))*",
+    r"(foo|bar)+",
+    r"https?://\S+",
+    r"(早上|晚上)好",
+    r"(\[CQ:[^\]]+\])+",
+    r"(?:ab){3}",
+]
+
+# 多项式级回溯：允许保存，只给出提示
+WARN = [
+    r".*(\d+).*",
+    r".*?(\d+)",
+    r"\d+\d+",
+]
+
+
+@pytest.mark.parametrize("pattern", UNSAFE)
+def test_rejects_exponential(pattern):
+    assert analyze_regex(pattern)
+
+
+@pytest.mark.parametrize("pattern", SAFE)
+def test_accepts_safe(pattern):
+    warnings = []
+    assert analyze_regex(pattern, 0, warnings) == ""
+    assert warnings == []
+
+
+@pytest.mark.parametrize("pattern", WARN)
+def test_warns_polynomial(pattern):
+    warnings = []
+    assert analyze_regex(pattern, 0, warnings) == ""
+    assert warnings
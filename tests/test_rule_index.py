@@ -0,0 +1,148 @@
+import asyncio
+import copy
+import random
+
+import pytest
+
+pytest.importorskip("astrbot")
+
+from fakes import FakePlugin  # noqa: E402
+from modules.matcher import MessageText  # noqa: E402
+from modules.rule_index import (  # noqa: E402
+    FLAGS_CHANGED, GROUPS_CHANGED, KEYWORD_CHANGED, RULE_ADDED, RULE_REMOVED,
+)
+
+
+def _rule(keyword, regex=False, groups=("100",)):
+    return {"keyword": keyword, "entries": [{"text": keyword, "images": []}],
+            "regex": regex, "enabled": True, "mode": "whitelist", "groups": list(groups)}
+
+
+def _detected(plugin, message, group_id="100"):
+    return [rule.keyword for rule in plugin.detect_module.index.iter_matches(MessageText(message), group_id)]
+
+
+def _plugin(*keywords):
+    return FakePlugin(data={"command_triggered": [], "auto_detect": [_rule(k) for k in keywords]})
+
+
+def test_fallback_rebuilds_in_background_and_serves_old_index():
+    async def scenario():
+        plugin = _plugin("苹果", "香蕉")
+        index = plugin.detect_module.index
+        rules = plugin.data["auto_detect"]
+        # 绕过 notify 的修改，随后的增量变更对不上列表，只能完整重建
+        rules.append(_rule("橘子"))
+        rules[0]["groups"].append("200")
+        plugin.index_manager.notify("auto_detect", GROUPS_CHANGED, 0)
+
+        assert index._rebuild_task is not None and not index._rebuild_task.done()
+        # 重建完成前匹配继续使用旧索引，不阻塞事件循环
+        assert _detected(plugin, "苹果 橘子") == ["苹果"]
+        await index._rebuild_task
+        await asyncio.sleep(0.05)
+        assert _detected(plugin, "苹果 橘子") == ["苹果", "橘子"]
+        assert _detected(plugin, "苹果", "200") == ["苹果"]
+        assert not index._stale
+
+    asyncio.run(scenario())
+
+
+def test_changes_during_background_rebuild_are_not_lost():
+    async def scenario():
+        plugin = _plugin("苹果", "香蕉")
+        index = plugin.detect_module.index
+        rules = plugin.data["auto_detect"]
+        rules.append(_rule("橘子"))
+        plugin.index_manager.notify("auto_detect", GROUPS_CHANGED, 0)
+        # 后台重建期间又新增一条规则
+        rules.append(_rule("葡萄"))
+        plugin.index_manager.notify("auto_detect", RULE_ADDED, len(rules) - 1)
+        await index._rebuild_task
+        await asyncio.sleep(0.05)
+        assert _detected(plugin, "苹果香蕉橘子葡萄") == ["苹果", "香蕉", "橘子", "葡萄"]
+        assert index.positions("葡萄") == [3]
+
+    asyncio.run(scenario())
+
+
+def test_position_lookup_during_background_rebuild_is_exact():
+    async def scenario():
+        plugin = _plugin("苹果", "香蕉")
+        index = plugin.detect_module.index
+        rules = plugin.data["auto_detect"]
+        rules.insert(0, _rule("橘子"))
+        plugin.index_manager.notify("auto_detect", GROUPS_CHANGED, 1)
+        # 按位置查找规则时不能使用旧索引，立即同步重建，后台结果随后被丢弃
+        assert index.positions("香蕉") == [2]
+        version = index.version
+        await index._rebuild_task
+        assert index.version == version
+        assert _detected(plugin, "橘子香蕉") == ["橘子", "香蕉"]
+
+    asyncio.run(scenario())
+
+
+WORDS = ["苹果", "香蕉", "橘子", "Apple", "apple", "葡萄"]
+MESSAGES = ["苹果", "苹果 香蕉", "APPLE 橘子", "apple", "橘子葡萄香蕉", "葡萄 123", "无关"]
+
+
+def _matched_positions(plugin, data_key, message, group_id):
+    rules = plugin.data[data_key]
+    ids = {id(cfg): idx for idx, cfg in enumerate(rules)}
+    text = MessageText(message)
+    if data_key == "auto_detect":
+        matched = plugin.detect_module.index.iter_matches(text, group_id)
+    else:
+        matched = (rule for rule, _ in plugin.cmd_module.index.iter_matches(text, group_id))
+    return [ids[id(rule.cfg)] for rule in matched]
+
+
+def _mutate(rng, rules):
+    """随机修改一条规则，返回应上报的 (事件, 位置)"""
+    op = rng.choice(["add", "add", "remove", "keyword", "flags", "groups", "enabled"])
+    if op == "add" or not rules:
+        rules.append(_rule(rng.choice(WORDS) + rng.choice(["", "", r"\d+"]), regex=rng.random() < 0.3,
+                           groups=rng.sample(["100", "200"], rng.randint(0, 2))))
+        return RULE_ADDED, len(rules) - 1
+    idx = rng.randrange(len(rules))
+    cfg = rules[idx]
+    if op == "remove":
+        rules.pop(idx)
+        return RULE_REMOVED, idx
+    if op == "keyword":
+        cfg["keyword"] = rng.choice(WORDS)
+        return KEYWORD_CHANGED, idx
+    if op == "flags":
+        cfg["regex"] = not cfg.get("regex", False)
+        return FLAGS_CHANGED, idx
+    if op == "groups":
+        cfg["mode"] = rng.choice(["whitelist", "blacklist"])
+        cfg["groups"] = rng.sample(["100", "200"], rng.randint(0, 2))
+        return GROUPS_CHANGED, idx
+    cfg["enabled"] = not cfg.get("enabled", True)
+    return GROUPS_CHANGED, idx
+
+
+@pytest.mark.parametrize("data_key", ["command_triggered", "auto_detect"])
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_updates_match_full_rebuild(data_key, seed, monkeypatch):
+    rng = random.Random(seed)
+    plugin = FakePlugin(data={"command_triggered": [], "auto_detect": []})
+    index = plugin.index_manager.indexes[data_key]
+    # 每次变更都按规则上报，不应退回完整重建
+    monkeypatch.setattr(index, "_fallback", lambda event, idx: pytest.fail(f"退回完整重建: {event} {idx}"))
+    rules = plugin.data[data_key]
+    for step in range(60):
+        plugin.index_manager.notify(data_key, *_mutate(rng, rules))
+        if step % 6:
+            continue
+        fresh = FakePlugin(data=copy.deepcopy(plugin.data))
+        fresh_index = fresh.index_manager.indexes[data_key]
+        assert index.counts() == fresh_index.counts()
+        for word in WORDS:
+            assert index.positions(word) == fresh_index.positions(word)
+        for message in MESSAGES:
+            for group_id in ("100", "200", None):
+                assert (_matched_positions(plugin, data_key, message, group_id)
+                        == _matched_positions(fresh, data_key, message, group_id))
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("astrbot")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.rule_index import ENTRIES_CHANGED, RULE_ADDED, RULE_REMOVED  # noqa: E402
+from modules.sqlite_store import SqliteRepository, export_to_json, sqlite_path  # noqa: E402
+from modules.storage import JOURNAL_SEQ_KEY, journal_path  # noqa: E402
+
+DATA = {
+    "command_triggered": [
+        {"keyword": "菜单", "entries": [{"text": "菜单内容", "images": [{"path": "a.png", "url": "http://x/a.png"}]}],
+         "regex": False, "enabled": True, "mode": "whitelist", "groups": ["100", 200]},
+    ],
+    "auto_detect": [
+        # 缺少 groups/regex 等字段、带有额外字段的手写规则，读回时应保持原样
+        {"keyword": "早安", "entries": ["纯文本回复"], "cooldown": 5, "note": "手动添加"},
+        {"keyword": "^晚安$", "regex": True, "groups": []},
+    ],
+}
+
+
+def _open(data_file):
+    repository = SqliteRepository(str(data_file), None)
+    data = repository.load()
+    repository._source = lambda: data
+    return repository, data
+
+
+def _reload(data_file):
+    repository = SqliteRepository(str(data_file), None)
+    try:
+        return repository.load()
+    finally:
+        repository.close()
+
+
+def test_migrates_keywords_json_with_leftover_journal(tmp_path):
+    data_file = tmp_path / "keywords.json"
+    data_file.write_text(json.dumps({**DATA, JOURNAL_SEQ_KEY: 0}, ensure_ascii=False), encoding="utf-8")
+    record = {"n": 1, "key": "auto_detect", "idx": 2, "op": "add", "rule": {"keyword": "午安", "entries": []}}
+    with open(journal_path(str(data_file)), "w", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    repository, data = _open(data_file)
+    repository.close()
+    expected = json.loads(json.dumps(DATA))
+    expected["auto_detect"].append(record["rule"])
+    assert data == expected
+    assert not data_file.exists() and (tmp_path / "keywords.json.migrated").exists()
+    assert not os.path.exists(journal_path(str(data_file)))
+    # 再次启动直接从数据库读取，字段缺失与否与原数据一致
+    assert _reload(data_file) == expected
+
+
+def test_per_record_writes_match_memory(tmp_path):
+    data_file = tmp_path / "keywords.json"
+    data_file.write_text(json.dumps(DATA, ensure_ascii=False), encoding="utf-8")
+    repository, data = _open(data_file)
+    rules = data["auto_detect"]
+    rules.insert(len(rules), {"keyword": "你好", "entries": [{"text": "你好呀", "images": []}], "groups": ["100"]})
+    repository.record("auto_detect", RULE_ADDED, 2)
+    rules[1].setdefault("entries", []).append({"text": "好梦", "images": []})
+    repository.record("auto_detect", ENTRIES_CHANGED, 1)
+    rules.pop(0)
+    repository.record("auto_detect", RULE_REMOVED, 0)
+    repository.note_save()
+    kind, records = repository.take_batch()
+    assert kind == "ops" and len(records) == 3
+    repository.write_batch((kind, records))
+    repository.close()
+    assert _reload(data_file) == data
+
+
+def test_export_to_json_restores_file_storage(tmp_path):
+    data_file = tmp_path / "keywords.json"
+    data_file.write_text(json.dumps(DATA, ensure_ascii=False), encoding="utf-8")
+    repository, _ = _open(data_file)
+    repository.close()
+    assert not data_file.exists()
+
+    assert export_to_json(str(data_file))
+    assert json.loads(data_file.read_text(encoding="utf-8")) == DATA
+    assert not os.path.exists(sqlite_path(str(data_file)))
+    assert os.path.exists(sqlite_path(str(data_file)) + ".migrated")
+    # keywords.json 已存在时不再导出，避免覆盖
+    assert not export_to_json(str(data_file))
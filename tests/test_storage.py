@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("astrbot")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.rule_index import KEYWORD_CHANGED, RULE_ADDED, RULE_REMOVED  # noqa: E402
+from modules.storage import JOURNAL_SEQ_KEY, JournalRepository, JsonRepository, journal_path  # noqa: E402
+
+
+def _rule(keyword):
+    return {"keyword": keyword, "entries": [{"text": f"{keyword}回复", "images": []}],
+            "regex": False, "enabled": True, "mode": "whitelist", "groups": ["100"]}
+
+
+def _seed(tmp_path, *keywords):
+    data_file = tmp_path / "keywords.json"
+    data_file.write_text(json.dumps({"command_triggered": [], "auto_detect": [_rule(k) for k in keywords]},
+                                    ensure_ascii=False), encoding="utf-8")
+    return str(data_file)
+
+
+def _open(data_file, compact_bytes=1 << 20):
+    repository = JournalRepository(data_file, None, compact_bytes)
+    data = repository.load()
+    repository._source = lambda: data
+    return repository, data
+
+
+def _edit(repository, data):
+    """新增、修改、删除各一次，每次修改后立即记录，与 RuleIndexManager.notify 的顺序一致"""
+    rules = data["auto_detect"]
+    rules.append(_rule("丁"))
+    repository.record("auto_detect", RULE_ADDED, len(rules) - 1)
+    rules[0]["keyword"] = "甲甲"
+    repository.record("auto_detect", KEYWORD_CHANGED, 0)
+    rules.pop(1)
+    repository.record("auto_detect", RULE_REMOVED, 1)
+    repository.note_save()
+
+
+def test_journal_replays_appended_records(tmp_path):
+    data_file = _seed(tmp_path, "甲", "乙", "丙")
+    repository, data = _open(data_file)
+    _edit(repository, data)
+    kind, payload = repository.take_batch()
+    assert kind == "append" and payload.count("\n") == 3
+    repository.write_batch((kind, payload))
+
+    reloaded, replayed = _open(data_file)
+    assert replayed == data
+    assert [r["keyword"] for r in replayed["auto_detect"]] == ["甲甲", "丙", "丁"]
+    assert reloaded.seq == 3
+    # 快照本身未被改写
+    assert json.loads(open(data_file, encoding="utf-8").read())["auto_detect"][0]["keyword"] == "甲"
+
+
+def test_journal_ignores_torn_last_line_and_rewrites_snapshot(tmp_path):
+    data_file = _seed(tmp_path, "甲", "乙", "丙")
+    repository, data = _open(data_file)
+    _edit(repository, data)
+    payload = repository.take_batch()[1]
+    # 崩溃时最后一条记录只写了一半
+    repository.write_batch(("append", payload[:-20]))
+
+    reloaded, replayed = _open(data_file)
+    assert [r["keyword"] for r in replayed["auto_detect"]] == ["甲甲", "乙", "丙", "丁"]
+    assert reloaded.seq == 2
+    assert os.path.getsize(journal_path(data_file)) == 0
+    snapshot = json.loads(open(data_file, encoding="utf-8").read())
+    assert snapshot.pop(JOURNAL_SEQ_KEY) == 2
+    assert snapshot == replayed
+
+
+def test_journal_compacts_past_threshold(tmp_path):
+    data_file = _seed(tmp_path, "甲", "乙", "丙")
+    repository, data = _open(data_file, compact_bytes=64)
+    _edit(repository, data)
+    kind, snapshot = repository.take_batch()
+    assert kind == "compact" and snapshot[JOURNAL_SEQ_KEY] == 3
+    repository.write_batch((kind, snapshot))
+    assert repository.compactions == 1
+    assert os.path.getsize(journal_path(data_file)) == 0
+
+    _, replayed = _open(data_file)
+    assert replayed == data
+
+
+def test_journal_skips_records_already_in_snapshot(tmp_path):
+    data_file = _seed(tmp_path, "甲", "乙", "丙")
+    repository, data = _open(data_file)
+    _edit(repository, data)
+    repository.write_batch(repository.take_batch())
+    # 压缩时快照已替换、日志尚未清空就崩溃：日志中的记录都不应再次应用
+    journal = open(journal_path(data_file), encoding="utf-8").read()
+    repository.write_batch(("compact", {**data, JOURNAL_SEQ_KEY: repository.seq}))
+    with open(journal_path(data_file), "w", encoding="utf-8") as f:
+        f.write(journal)
+
+    reloaded, replayed = _open(data_file)
+    assert replayed == data
+    assert reloaded.seq == 3
+
+
+def test_json_repository_merges_leftover_journal(tmp_path):
+    data_file = _seed(tmp_path, "甲", "乙", "丙")
+    repository, data = _open(data_file)
+    _edit(repository, data)
+    repository.write_batch(repository.take_batch())
+
+    json_repository = JsonRepository(data_file, lambda: None)
+    assert not json_repository.streamable()
+    merged = json_repository.load()
+    assert merged == data
+    assert not os.path.exists(journal_path(data_file))
+    assert json.loads(open(data_file, encoding="utf-8").read()) == data
+    assert json_repository.streamable()
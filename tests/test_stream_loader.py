@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.stream_loader import FIELD, ITEM, ChunkReader, StreamingLoader, iter_top_level  # noqa: E402
+
+DATA = {
+    "command_triggered": [
+        {"keyword": "菜单", "entries": [{"text": "多字节字符：🍎，转义：\\\" \\u4e2d", "images": []}]},
+    ],
+    "auto_detect": [{"keyword": f"检测{i}", "cooldown": 1.5e1, "groups": [str(i)]} for i in range(40)],
+    "empty": [],
+    "_journal_seq": 12345,
+    "note": {"nested": [1, 2, {"x": None}]},
+}
+
+
+def _encode(data, indent=2):
+    return json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
+
+
+def _rebuild(raw: bytes, chunk_size: int) -> dict:
+    result = {}
+    for kind, key, value in iter_top_level(ChunkReader(io.BytesIO(raw), chunk_size)):
+        if kind == FIELD:
+            result[key] = value
+        else:
+            result[key].append(value)
+    return result
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_small_chunks_parse_like_json_load(chunk_size, indent):
+    # 块边界会落在多字节字符、转义序列与数字中间
+    raw = _encode(DATA, indent)
+    assert _rebuild(raw, chunk_size) == json.loads(raw)
+
+
+def test_items_are_yielded_one_rule_at_a_time():
+    raw = _encode(DATA)
+    events = list(iter_top_level(ChunkReader(io.BytesIO(raw), 5)))
+    assert [kind for kind, key, _ in events if key == "auto_detect"] == [FIELD] + [ITEM] * 40
+    assert _rebuild(b" { } ", 1) == {}
+
+
+@pytest.mark.parametrize("raw", [b"[]", b'{"a": [1 2]}', b'{"a" 1}', b'{"a": [1, 2]', b'{"a": tru'])
+def test_malformed_input_raises_value_error(raw):
+    with pytest.raises(ValueError):
+        _rebuild(raw, 2)
+
+
+def test_streaming_loader_publishes_batches_on_loop(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_bytes(_encode(DATA))
+    published = []
+    finished = []
+
+    async def scenario():
+        done = asyncio.Event()
+
+        def publish(batch):
+            published.extend(batch)
+            return sum(kind == ITEM for kind, _, _ in batch)
+
+        def finish(error):
+            finished.append(error)
+            done.set()
+
+        loader = StreamingLoader(str(path), publish, finish, batch_size=8)
+        loader.start(asyncio.get_running_loop())
+        await asyncio.wait_for(done.wait(), 5)
+        return loader
+
+    loader = asyncio.run(scenario())
+    assert finished == [None] and loader.done
+    assert loader.loaded == 41 and loader.percent == 100
+    result = {}
+    for kind, key, value in published:
+        if kind == FIELD:
+            result[key] = value
+        else:
+            result[key].append(value)
+    assert result == DATA
@@ -4,10 +4,17 @@ import hashlib
 import hmac
 import json
 import os
+import re
 import secrets
 import time
 import urllib.parse
 from datetime import datetime, timedelta
+from itertools import chain
+
+from ..modules.rule_index import RULE_ADDED, RULE_REMOVED, KEYWORD_CHANGED, FLAGS_CHANGED, GROUPS_CHANGED, ENTRIES_CHANGED
+from ..modules.cooldown import COOLDOWN_SCOPES, DEFAULT_SCOPES
+from ..modules.rule_model import group_memory_stats
+from ..modules.lazy_entries import LazyEntries
 
 # HTML 模板
 HTML_TEMPLATE = '''<!DOCTYPE html>
@@ -976,8 +983,22 @@ class WebUIServer:
         return not entry.get("text") and not entry.get("images")
 
     def _ensure_entries(self, item: dict) -> list:
-        """确保 entries 为兼容结构"""
+        """确保 entries 为兼容结构，用于修改回复；按需加载的条目此时才转为常驻列表"""
+        raw_entries = item.get("entries", [])
+        if isinstance(raw_entries, LazyEntries):
+            raw_entries = raw_entries.to_list()
+        normalized = self._normalize_entries(raw_entries)
+        item["entries"] = normalized
+        return normalized
+
+    def _view_entries(self, item: dict) -> list:
+        """用于展示的回复列表；按需加载的条目经 EntryStore 的 LRU 读取，不写回规则，也不常驻内存"""
         raw_entries = item.get("entries", [])
+        if isinstance(raw_entries, LazyEntries):
+            return self._normalize_entries(list(raw_entries))
+        return self._ensure_entries(item)
+
+    def _normalize_entries(self, raw_entries) -> list:
         if not isinstance(raw_entries, list):
             raw_entries = []
 
@@ -1005,7 +1026,6 @@ class WebUIServer:
 
             normalized.append({"text": text, "images": cleaned_images})
 
-        item["entries"] = normalized
         return normalized
 
     def _entry_to_form_data(self, entry: dict) -> tuple[str, str]:
@@ -1040,6 +1060,74 @@ class WebUIServer:
             return f"(无文本)\n[图片:{image_count}]"
         return text or "(空回复)"
 
+    def _regex_error(self, pattern: str, flags: int) -> str:
+        """校验提交的正则，返回错误说明，无误时返回空字符串"""
+        risk = self.plugin._regex_risk(pattern, flags)
+        if risk:
+            return f"正则表达式存在安全风险：{risk}"
+        try:
+            self.plugin.regex_cache.compile(pattern, flags)
+        except re.error as e:
+            return f"无效的正则表达式: {e}"
+        warning = self.plugin._regex_warning(pattern, flags)
+        if warning:
+            self.plugin.logger.warning(f"正则 {pattern} 已保存，但{warning}")
+        return ""
+
+    def _render_regex_backend(self, pattern: str, flags: int) -> str:
+        """渲染正则实际使用的匹配引擎，回退到 re 时附带原因"""
+        backend, reason = self.plugin.regex_cache.backend(pattern, flags)
+        if backend is None:
+            text = f"无效的正则表达式: {reason}"
+        elif backend == "re2":
+            text = "匹配引擎: RE2（线性时间）"
+        elif self.plugin.regex_cache.use_re2:
+            text = f"匹配引擎: re（{reason}）"
+        else:
+            text = "匹配引擎: re"
+        return f'<div style="margin-top: 0.5rem; color: var(--text-secondary); font-size: 0.85rem;">{self._escape_html(text)}</div>'
+
+    def _render_cooldown_fields(self, item: dict) -> str:
+        """渲染检测词的冷却时长与冷却范围表单项"""
+        cooldown = item.get("cooldown")
+        scopes = item.get("cooldown_scopes") or DEFAULT_SCOPES
+        checkboxes = "".join(
+            f'''
+            <label style="margin-right: 1rem;">
+                <input type="checkbox" name="cooldown_scope_{scope}" {"checked" if scope in scopes else ""} style="width: auto; margin-right: 0.5rem;">
+                {label}
+            </label>'''
+            for scope, label in COOLDOWN_SCOPES.items()
+        )
+        return f'''
+        <div class="form-group">
+            <label>冷却时间（秒，留空使用全局设置 {self.plugin.config.get("cooldown", 0)}s，0 表示不冷却）</label>
+            <input type="number" name="cooldown" min="0" value="{"" if cooldown is None else cooldown}">
+        </div>
+        <div class="form-group">
+            <label>冷却范围（可多选，任一范围处于冷却中时不触发）</label>
+            <div>{checkboxes}
+            </div>
+        </div>'''
+
+    def _apply_cooldown_fields(self, item: dict, form_data: dict):
+        """从表单更新检测词的冷却时长与冷却范围，未设置的项移除以沿用全局配置"""
+        cooldown = self._safe_int(form_data.get("cooldown", "").strip(), -1)
+        if cooldown >= 0:
+            item["cooldown"] = cooldown
+        else:
+            item.pop("cooldown", None)
+        scopes = [scope for scope in COOLDOWN_SCOPES if form_data.get(f"cooldown_scope_{scope}") == "on"]
+        if scopes and scopes != list(DEFAULT_SCOPES):
+            item["cooldown_scopes"] = scopes
+        else:
+            item.pop("cooldown_scopes", None)
+
+    def _render_error(self, query_params: dict) -> str:
+        """渲染通过 error 参数传回的错误提示"""
+        error = query_params.get("error")
+        return f'<div class="alert alert-error">{self._escape_html(error)}</div>' if error else ""
+
     def _is_regex_enabled(self, item: dict) -> bool:
         """兼容读取 regex / is_regex"""
         return bool(item.get("regex", item.get("is_regex", False)))
@@ -1063,13 +1151,31 @@ class WebUIServer:
             keywords_active='class="active"' if active_page == "keywords" else "",
             detects_active='class="active"' if active_page == "detects" else "",
             images_active='class="active"' if active_page == "images" else ""
-        )
+        ) + self._render_loading_status()
+
+    def _render_loading_status(self) -> str:
+        """流式加载尚未完成时在页面顶部显示加载进度，读取数据失败时显示错误"""
+        if self.plugin.load_error:
+            return f'''
+<div class="container" style="padding-bottom: 0;">
+    <div class="alert alert-error" style="margin-bottom: 0;">
+        {self._escape_html(self.plugin.load_error)}。为避免覆盖原有数据，修改不会被保存，请修复 keywords.json 后重载插件。
+    </div>
+</div>'''
+        loader = self.plugin.loader
+        if loader is None or loader.done:
+            return ""
+        return f'''
+<div class="container" style="padding-bottom: 0;">
+    <div class="card" style="margin-bottom: 0; color: var(--text-secondary);">
+        正在加载关键词数据：已加载 {loader.loaded} 条规则，已解析 {loader.percent}%。列表暂不完整，加载期间的修改会在加载完成后保存。
+    </div>
+</div>'''
 
     def _render_dashboard(self) -> str:
         """渲染仪表板页面"""
-        data = self.plugin.data
-        keywords_count = len(data.get("command_triggered", []))
-        detects_count = len(data.get("auto_detect", []))
+        keywords_active, keywords_count = self.plugin.cmd_module.index.counts()
+        detects_active, detects_count = self.plugin.detect_module.index.counts()
 
         # 统计图片数量
         images_count = 0
@@ -1077,18 +1183,47 @@ class WebUIServer:
             images_count = len([f for f in os.listdir(self.plugin.image_dir)
                               if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp'))])
 
+        # 正则限时执行开启时展示超时次数
+        regex_timeout_card = ""
+        if self.plugin.regex_pool is not None:
+            regex_timeout_card = f'''
+        <div class="stat-card">
+            <div class="stat-value">{self.plugin.regex_pool.timeout_count}</div>
+            <div class="stat-label">正则超时次数</div>
+        </div>'''
+
+        # 冷却记录：当前冷却中的会话数 / 拦截次数 / 过期清理数
+        cooldown_stats = self.plugin.detect_module.cooldowns.stats()
+
+        # 群号驻留：每个群号只存一份字符串，展示引用数与估算节省的内存
+        group_stats = group_memory_stats(chain(
+            self.plugin.cmd_module.index.all_rules(), self.plugin.detect_module.index.all_rules()
+        ))
+        saved = group_stats["saved_bytes"]
+        saved_str = f"{saved / 1024:.1f} KB" if saved < 1024 * 1024 else f"{saved / (1024 * 1024):.2f} MB"
+
+        # 回复内容按需加载时展示缓存情况
+        entry_store_card = ""
+        if self.plugin.entry_store is not None:
+            entry_stats = self.plugin.entry_store.stats()
+            entry_store_card = f'''
+        <div class="stat-card">
+            <div class="stat-value">{entry_stats["cached"]} / {entry_stats["count"]}</div>
+            <div class="stat-label">回复内容缓存（命中 {entry_stats["hits"]} 次 / 读取 {entry_stats["misses"]} 次）</div>
+        </div>'''
+
         content = self._render_header("dashboard")
         content += f'''
 <div class="container">
     <h1 style="margin-bottom: 1.5rem;">仪表板</h1>
     <div class="stats-grid">
         <div class="stat-card">
-            <div class="stat-value">{keywords_count}</div>
-            <div class="stat-label">关键词</div>
+            <div class="stat-value">{keywords_active} / {keywords_count}</div>
+            <div class="stat-label">关键词（启用 / 总数）</div>
         </div>
         <div class="stat-card">
-            <div class="stat-value">{detects_count}</div>
-            <div class="stat-label">检测词</div>
+            <div class="stat-value">{detects_active} / {detects_count}</div>
+            <div class="stat-label">检测词（启用 / 总数）</div>
         </div>
         <div class="stat-card">
             <div class="stat-value">{images_count}</div>
@@ -1098,6 +1233,14 @@ class WebUIServer:
             <div class="stat-value">{self.plugin.config.get("cooldown", 0)}s</div>
             <div class="stat-label">冷却时间</div>
         </div>
+        <div class="stat-card">
+            <div class="stat-value">{cooldown_stats["active"]}</div>
+            <div class="stat-label">冷却中会话（拦截 {cooldown_stats["hits"]} 次 / 已过期 {cooldown_stats["expired"]}）</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-value">{saved_str}</div>
+            <div class="stat-label">群号驻留节省内存（{group_stats["unique"]} 个群号 / {group_stats["refs"]} 处引用）</div>
+        </div>{entry_store_card}{regex_timeout_card}
     </div>
 
     <div class="card">
@@ -1130,6 +1273,7 @@ class WebUIServer:
 
         content = self._render_header("keywords")
         content += '<div class="container">'
+        content += self._render_error(query_params)
 
         if action == "add":
             # 添加关键词表单
@@ -1176,10 +1320,11 @@ class WebUIServer:
             if 0 <= idx < len(keywords):
                 item = keywords[idx]
                 keyword = item.get("keyword", "")
-                entries = self._ensure_entries(item)
+                entries = self._view_entries(item)
                 mode = item.get("mode", "all")
                 groups = item.get("groups", [])
                 groups_str = ", ".join(str(g) for g in groups) if groups else ""
+                backend_html = self._render_regex_backend(keyword, self.plugin.cmd_module._regex_flags()) if self._is_regex_enabled(item) else ""
 
                 content += f'''
 <h1 style="margin-bottom: 1.5rem;">编辑关键词</h1>
@@ -1191,6 +1336,7 @@ class WebUIServer:
         <div class="form-group">
             <label>关键词</label>
             <input type="text" name="keyword" value="{self._escape_html(keyword)}" required>
+            {backend_html}
         </div>
         <div class="form-group">
             <label>群聊限制模式</label>
@@ -1371,6 +1517,7 @@ function doSearch() {{
 
         content = self._render_header("detects")
         content += '<div class="container">'
+        content += self._render_error(query_params)
 
         if action == "add":
             # 添加检测词表单
@@ -1424,10 +1571,11 @@ function doSearch() {{
                 item = detects[idx]
                 keyword = item.get("keyword", "")
                 is_regex = self._is_regex_enabled(item)
-                entries = self._ensure_entries(item)
+                entries = self._view_entries(item)
                 mode = item.get("mode", "all")
                 groups = item.get("groups", [])
                 groups_str = ", ".join(str(g) for g in groups) if groups else ""
+                backend_html = self._render_regex_backend(keyword, self.plugin.detect_module._regex_flags(item)) if is_regex else ""
 
                 content += f'''
 <h1 style="margin-bottom: 1.5rem;">编辑检测词</h1>
@@ -1439,6 +1587,7 @@ function doSearch() {{
         <div class="form-group">
             <label>检测词</label>
             <input type="text" name="keyword" value="{self._escape_html(keyword)}" required>
+            {backend_html}
         </div>
         <div class="form-group">
             <label>
@@ -1457,7 +1606,7 @@ function doSearch() {{
         <div class="form-group">
             <label>群号列表（逗号分隔，仅在白名单/黑名单模式下有效）</label>
             <input type="text" name="groups" value="{self._escape_html(groups_str)}" placeholder="如: 123456789,987654321">
-        </div>
+        </div>{self._render_cooldown_fields(item)}
         <div style="display: flex; gap: 1rem;">
             <button type="submit" class="btn btn-primary">保存</button>
             <a href="/detects" class="btn btn-secondary">取消</a>
@@ -1865,14 +2014,13 @@ function viewImage(src) {
                     return self._redirect_response(redirect_path)
 
                 # 检查是否已存在
-                existing = None
-                for item in keywords:
-                    if item.get("keyword") == keyword:
-                        existing = item
-                        break
+                positions = self.plugin.cmd_module.index.positions(keyword)
+                existing_idx = positions[0] if positions else None
+                existing = keywords[existing_idx] if positions else None
 
                 if existing:
                     self._ensure_entries(existing).append(reply)
+                    self.plugin.index_manager.notify("command_triggered", ENTRIES_CHANGED, existing_idx)
                 else:
                     keywords.append({
                         "keyword": keyword,
@@ -1880,28 +2028,42 @@ function viewImage(src) {
                         "mode": mode,
                         "groups": groups
                     })
+                    self.plugin.index_manager.notify("command_triggered", RULE_ADDED, len(keywords) - 1)
 
                 data_changed = True
 
         elif action == "delete":
             idx = self._safe_int(form_data.get("idx", -1), -1)
             if 0 <= idx < len(keywords):
-                keywords.pop(idx)
+                removed = keywords.pop(idx)
+                self.plugin.regex_cache.invalidate(removed.get("keyword", ""))
+                self.plugin.index_manager.notify("command_triggered", RULE_REMOVED, idx)
                 data_changed = True
 
         elif action in ("edit_meta", "edit", "add_entry", "edit_entry", "delete_entry"):
             idx = self._safe_int(form_data.get("idx", -1), -1)
             if 0 <= idx < len(keywords):
                 item = keywords[idx]
-                entries = self._ensure_entries(item)
+                # 只修改关键词与生效群时不读取回复，避免按需加载的条目转为常驻
+                entries = self._ensure_entries(item) if action != "edit_meta" else None
                 redirect_path = f"/keywords?action=edit&idx={idx}"
 
                 if action in ("edit_meta", "edit"):
                     keyword = form_data.get("keyword", "").strip()
                     if keyword:
+                        keyword_changed = keyword != item.get("keyword")
+                        if keyword_changed and self._is_regex_enabled(item):
+                            error = self._regex_error(keyword, self.plugin.cmd_module._regex_flags())
+                            if error:
+                                return self._redirect_with_error(redirect_path, error)
+                        if keyword_changed:
+                            self.plugin.regex_cache.invalidate(item.get("keyword", ""))
                         item["keyword"] = keyword
                         item["mode"] = form_data.get("mode", "all")
                         item["groups"] = self._parse_groups(form_data.get("groups", "").strip())
+                        self.plugin.index_manager.notify(
+                            "command_triggered", KEYWORD_CHANGED if keyword_changed else GROUPS_CHANGED, idx
+                        )
                         data_changed = True
 
                 if action == "edit":
@@ -1938,6 +2100,9 @@ function viewImage(src) {
                         entries.pop(reply_idx)
                         data_changed = True
 
+                if data_changed and action != "edit_meta":
+                    self.plugin.index_manager.notify("command_triggered", ENTRIES_CHANGED, idx)
+
         if data_changed:
             self.plugin._save_data()
 
@@ -1972,18 +2137,24 @@ function viewImage(src) {
                 reply = self._build_reply_entry(reply_text, reply_images)
                 if self._entry_is_empty(reply):
                     return self._redirect_response(redirect_path)
+                if is_regex:
+                    error = self._regex_error(keyword, self.plugin.detect_module._regex_flags({}))
+                    if error:
+                        return self._redirect_with_error("/detects?action=add", error)
 
                 # 检查是否已存在
-                existing = None
-                for item in detects:
-                    if item.get("keyword") == keyword:
-                        existing = item
-                        break
+                positions = self.plugin.detect_module.index.positions(keyword)
+                existing_idx = positions[0] if positions else None
+                existing = detects[existing_idx] if positions else None
 
                 if existing:
                     self._ensure_entries(existing).append(reply)
+                    regex_changed = existing.get("regex", False) != is_regex
                     existing["regex"] = is_regex
                     existing["is_regex"] = is_regex
+                    self.plugin.index_manager.notify(
+                        "auto_detect", FLAGS_CHANGED if regex_changed else ENTRIES_CHANGED, existing_idx
+                    )
                 else:
                     detects.append({
                         "keyword": keyword,
@@ -1993,31 +2164,47 @@ function viewImage(src) {
                         "mode": mode,
                         "groups": groups
                     })
+                    self.plugin.index_manager.notify("auto_detect", RULE_ADDED, len(detects) - 1)
 
                 data_changed = True
 
         elif action == "delete":
             idx = self._safe_int(form_data.get("idx", -1), -1)
             if 0 <= idx < len(detects):
-                detects.pop(idx)
+                removed = detects.pop(idx)
+                self.plugin.regex_cache.invalidate(removed.get("keyword", ""))
+                self.plugin.index_manager.notify("auto_detect", RULE_REMOVED, idx)
                 data_changed = True
 
         elif action in ("edit_meta", "edit", "add_entry", "edit_entry", "delete_entry"):
             idx = self._safe_int(form_data.get("idx", -1), -1)
             if 0 <= idx < len(detects):
                 item = detects[idx]
-                entries = self._ensure_entries(item)
+                # 只修改关键词与生效群时不读取回复，避免按需加载的条目转为常驻
+                entries = self._ensure_entries(item) if action != "edit_meta" else None
                 redirect_path = f"/detects?action=edit&idx={idx}"
 
                 if action in ("edit_meta", "edit"):
                     keyword = form_data.get("keyword", "").strip()
                     if keyword:
                         is_regex = form_data.get("is_regex", "") == "on"
+                        matcher_changed = keyword != item.get("keyword") or is_regex != item.get("regex", False)
+                        if matcher_changed and is_regex:
+                            error = self._regex_error(keyword, self.plugin.detect_module._regex_flags(item))
+                            if error:
+                                return self._redirect_with_error(redirect_path, error)
+                        if matcher_changed:
+                            self.plugin.regex_cache.invalidate(item.get("keyword", ""))
                         item["keyword"] = keyword
                         item["regex"] = is_regex
                         item["is_regex"] = is_regex
                         item["mode"] = form_data.get("mode", "all")
                         item["groups"] = self._parse_groups(form_data.get("groups", "").strip())
+                        if "cooldown" in form_data:
+                            self._apply_cooldown_fields(item, form_data)
+                        self.plugin.index_manager.notify(
+                            "auto_detect", KEYWORD_CHANGED if matcher_changed else GROUPS_CHANGED, idx
+                        )
                         data_changed = True
 
                 if action == "edit":
@@ -2054,6 +2241,9 @@ function viewImage(src) {
                         entries.pop(reply_idx)
                         data_changed = True
 
+                if data_changed and action != "edit_meta":
+                    self.plugin.index_manager.notify("auto_detect", ENTRIES_CHANGED, idx)
+
         if data_changed:
             self.plugin._save_data()
 
@@ -2215,6 +2405,11 @@ function viewImage(src) {
         ]
         return "\r\n".join(headers).encode('utf-8') + b"\r\n\r\n" + body
 
+    def _redirect_with_error(self, location: str, error: str) -> bytes:
+        """重定向并通过 error 参数在目标页面显示错误提示"""
+        separator = "&" if "?" in location else "?"
+        return self._redirect_response(f"{location}{separator}error={urllib.parse.quote(error)}")
+
     async def start(self):
         """启动 WebUI 服务器"""
         try: